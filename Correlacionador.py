@@ -1,31 +1,44 @@
 import pandas as pd
-from difflib import SequenceMatcher
+from collections.abc import Iterator
 from ParametrosProcessamento import ParametrosProcessamento
 from Correlacao import Correlacao, ResultadoCorrelacao
-from ConversorMedidas import ConversorMedidas
+from ConversorMedidas import ConversorMedidas, GrandezaFisica
+from progresso import Progresso
+from leitura_planilhas import ler_colunas
+from pontuadores import obter_pontuador, similaridade as similaridade_par
 
 class Correlacionador:
     def __init__(self, parametros: ParametrosProcessamento):
         self.parametros = parametros
-        self.planilha_orcamento = pd.read_excel(parametros.orcamento.caminho_planilha)
-        self.planilha_referencia = pd.read_excel(parametros.referencia.caminho_planilha)
-        self.conversor_medidas = ConversorMedidas()
-        self.indices = {
-            'orcamento': {
-                'descricao': self.transformar_indice_coluna(parametros.orcamento.coluna_descrição),
-                'unidade': self.transformar_indice_coluna(parametros.orcamento.coluna_unidade_medida)
+        # Só as colunas mapeadas (e, no orçamento, só as linhas pesquisadas); o índice é a linha do Excel
+        self.planilha_orcamento = ler_colunas(
+            parametros.orcamento.caminho_planilha,
+            {
+                'descricao': parametros.orcamento.coluna_descrição,
+                'unidade': parametros.orcamento.coluna_unidade_medida
             },
-            'referencia': {
-                'descricao': self.transformar_indice_coluna(parametros.referencia.coluna_descrição),
-                'unidade': self.transformar_indice_coluna(parametros.referencia.coluna_unidade_medida),
-                'material': self.transformar_indice_coluna(parametros.referencia.coluna_material),
-                'mao_obra': self.transformar_indice_coluna(parametros.referencia.coluna_mao_de_obra)
+            primeira_linha=parametros.pesquisa.ComecoPesquisa,
+            ultima_linha=parametros.pesquisa.TerminoPesquisa
+        )
+        self.planilha_referencia = ler_colunas(
+            parametros.referencia.caminho_planilha,
+            {
+                'descricao': parametros.referencia.coluna_descrição,
+                'unidade': parametros.referencia.coluna_unidade_medida,
+                'material': parametros.referencia.coluna_material,
+                'mao_obra': parametros.referencia.coluna_mao_de_obra
             }
+        )
+        self.conversor_medidas = ConversorMedidas()
+        # Posição de cada coluna nos DataFrames projetados
+        self.indices = {
+            planilha: {coluna: posicao for posicao, coluna in enumerate(dados.columns)}
+            for planilha, dados in (('orcamento', self.planilha_orcamento), ('referencia', self.planilha_referencia))
         }
     
     @staticmethod
     def similaridade(a: str, b: str) -> float:
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+        return similaridade_par(a.lower(), b.lower())
 
     @staticmethod
     def transformar_indice_coluna(coluna: str) -> int:
@@ -36,77 +49,107 @@ class Correlacionador:
         return indice - 1
 
     def validar_linha_orcamento(self, linha_orcamento) -> bool:
-        indice_descricao = self.transformar_indice_coluna(self.parametros.orcamento.coluna_descrição)
-        indice_unidade = self.transformar_indice_coluna(self.parametros.orcamento.coluna_unidade_medida)
+        indice_descricao = self.indices['orcamento']['descricao']
+        indice_unidade = self.indices['orcamento']['unidade']
 
         descricao_valida = not pd.isna(linha_orcamento.iloc[indice_descricao]) and str(linha_orcamento.iloc[indice_descricao]).strip() != ""
         unidade_valida = not pd.isna(linha_orcamento.iloc[indice_unidade]) and str(linha_orcamento.iloc[indice_unidade]).strip() != ""
         
         return descricao_valida and unidade_valida
 
-    def validar_linha_referencia(self, linha_orcamento, linha_referencia) -> bool:
-        # Validar se há valores válidos (material ou mão de obra)
+    def referencia_tem_valor(self, linha_referencia) -> bool:
+        """Verifica se a referência tem valor de material ou de mão de obra maior que zero"""
         valor_material = linha_referencia.iloc[self.indices['referencia']['material']]
         valor_mao_obra = linha_referencia.iloc[self.indices['referencia']['mao_obra']]
         
-        tem_valor_valido = (
+        return (
             (not pd.isna(valor_material) and float(valor_material) > 0) or
             (not pd.isna(valor_mao_obra) and float(valor_mao_obra) > 0)
         )
-        
-        if not tem_valor_valido:
-            return False
 
-        # Validar compatibilidade das unidades de medida
+    def grandeza_da_linha(self, linha, planilha: str) -> GrandezaFisica:
+        """Grandeza física da unidade da linha ('orcamento' ou 'referencia')"""
         try:
-            unidade_orcamento = str(linha_orcamento.iloc[self.indices['orcamento']['unidade']]).strip()
-            unidade_referencia = str(linha_referencia.iloc[self.indices['referencia']['unidade']]).strip()
-            
-            grandeza_orcamento = self.conversor_medidas.identificar_grandeza(unidade_orcamento)
-            grandeza_referencia = self.conversor_medidas.identificar_grandeza(unidade_referencia)
-            
-            return grandeza_orcamento == grandeza_referencia and grandeza_orcamento != self.conversor_medidas.GrandezaFisica.NAO_IDENTIFICADA
-            
+            unidade = str(linha.iloc[self.indices[planilha]['unidade']]).strip()
+            return self.conversor_medidas.identificar_grandeza(unidade)
         except Exception:
+            return GrandezaFisica.NAO_IDENTIFICADA
+
+    def validar_linha_referencia(self, linha_orcamento, linha_referencia) -> bool:
+        # Validar se há valores válidos (material ou mão de obra)
+        if not self.referencia_tem_valor(linha_referencia):
             return False
 
-    def buscar_correlacoes(self) -> list[Correlacao]:
-        correlacoes = []
-        indices_colunas = {
-            'orcamento': {
-                'descricao': self.transformar_indice_coluna(self.parametros.orcamento.coluna_descrição),
-                'unidade': self.transformar_indice_coluna(self.parametros.orcamento.coluna_unidade_medida)
-            },
-            'referencia': {
-                'descricao': self.transformar_indice_coluna(self.parametros.referencia.coluna_descrição),
-                'unidade': self.transformar_indice_coluna(self.parametros.referencia.coluna_unidade_medida),
-                'material': self.transformar_indice_coluna(self.parametros.referencia.coluna_material),
-                'mao_obra': self.transformar_indice_coluna(self.parametros.referencia.coluna_mao_de_obra)
-            }
-        }
+        # Validar compatibilidade das unidades de medida
+        grandeza_orcamento = self.grandeza_da_linha(linha_orcamento, 'orcamento')
+        grandeza_referencia = self.grandeza_da_linha(linha_referencia, 'referencia')
+        return grandeza_orcamento == grandeza_referencia and grandeza_orcamento != GrandezaFisica.NAO_IDENTIFICADA
+
+    def particionar_referencias(self) -> dict[GrandezaFisica, list]:
+        """
+        Agrupa uma única vez as linhas de referência com valor válido pela grandeza
+        física da unidade. Linhas com unidade não identificada são descartadas.
+        """
+        particoes = {}
+        for idx_ref, linha_ref in self.planilha_referencia.iterrows():
+            if not self.referencia_tem_valor(linha_ref):
+                continue
+            grandeza = self.grandeza_da_linha(linha_ref, 'referencia')
+            if grandeza == GrandezaFisica.NAO_IDENTIFICADA:
+                continue
+            particoes.setdefault(grandeza, []).append((idx_ref, linha_ref))
+        return particoes
 
-        linhas_filtradas = self.planilha_orcamento[
-            (self.planilha_orcamento.index + 2 >= self.parametros.pesquisa.ComecoPesquisa) &
-            (self.planilha_orcamento.index + 2 <= self.parametros.pesquisa.TerminoPesquisa)
-        ]
+    def buscar_correlacoes(self, progresso: Progresso | None = None) -> list[Correlacao]:
+        return list(self.iterar_correlacoes(progresso))
+
+    def iterar_correlacoes(self, progresso: Progresso | None = None) -> Iterator[Correlacao]:
+        """
+        Gera a correlação de cada linha do orçamento assim que ela é calculada.
+        Com `progresso`, avança a cada linha e para (resultado parcial) se ele
+        for cancelado ou o prazo esgotar.
+        """
+        indices_colunas = self.indices
+
+        # Já lidas só no intervalo ComecoPesquisa..TerminoPesquisa
+        linhas_filtradas = self.planilha_orcamento
+
+        # Catálogo particionado por grandeza antes de qualquer comparação de texto
+        particoes = self.particionar_referencias()
+        descricoes_por_grandeza = {
+            grandeza: [str(linha_ref.iloc[indices_colunas['referencia']['descricao']]) for _, linha_ref in linhas]
+            for grandeza, linhas in particoes.items()
+        }
+        minusculas_por_grandeza = {
+            grandeza: [descricao.lower() for descricao in descricoes]
+            for grandeza, descricoes in descricoes_por_grandeza.items()
+        }
+        pontuar = obter_pontuador(self.parametros.pesquisa.Pontuador or "sequencematcher")
+        taxa = self.parametros.pesquisa.TaxaSimilaridade
+        if progresso is not None:
+            progresso.iniciar(len(linhas_filtradas))
 
         for idx_orc, linha_orc in linhas_filtradas.iterrows():
+            if progresso is not None:
+                if progresso.deve_parar:
+                    break
+                progresso.avancar()
             if not self.validar_linha_orcamento(linha_orc):
                 continue
 
             descricao_orcamento = str(linha_orc.iloc[indices_colunas['orcamento']['descricao']])
             resultados_encontrados = []
 
-            for idx_ref, linha_ref in self.planilha_referencia.iterrows():
-                if not self.validar_linha_referencia(linha_orc, linha_ref):
-                    continue
-
-                descricao_referencia = str(linha_ref.iloc[indices_colunas['referencia']['descricao']])
-                score = self.similaridade(descricao_orcamento, descricao_referencia)
+            # Só as referências da mesma grandeza (vazio para unidade não identificada), pontuadas em lote
+            grandeza = self.grandeza_da_linha(linha_orc, 'orcamento')
+            referencias = particoes.get(grandeza, [])
+            descricoes_referencia = descricoes_por_grandeza.get(grandeza, [])
+            scores = pontuar(descricao_orcamento.lower(), minusculas_por_grandeza.get(grandeza, []), taxa)
 
-                if score > self.parametros.pesquisa.TaxaSimilaridade:
+            for (idx_ref, linha_ref), descricao_referencia, score in zip(referencias, descricoes_referencia, scores.tolist()):
+                if score > taxa:
                     resultado = ResultadoCorrelacao(
-                        numeroLinha=idx_ref + 2,
+                        numeroLinha=int(idx_ref),
                         descricao=descricao_referencia,
                         unidadeMedida=str(linha_ref.iloc[indices_colunas['referencia']['unidade']]),
                         valorMaterial=float(linha_ref.iloc[indices_colunas['referencia']['material']]),
@@ -116,11 +159,8 @@ class Correlacionador:
                     resultados_encontrados.append(resultado)
 
             if resultados_encontrados:
-                correlacao = Correlacao(
-                    numeroLinha=idx_orc + 2,
+                yield Correlacao(
+                    numeroLinha=int(idx_orc),
                     descricao=descricao_orcamento,
                     resultados=resultados_encontrados
                 )
-                correlacoes.append(correlacao)
-
-        return correlacoes
@@ -1,7 +1,24 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class OperacaoCorrelacao:
     ComecoPesquisa: int
     TerminoPesquisa: int
     TaxaSimilaridade: float
+    MotorSimilaridade: str = "sequencematcher"  # "sequencematcher" (referência), "rapidfuzz", "rerank", "tfidf" ou "minhash"
+    IgnorarAcentos: bool = False  # Remove acentos (unicodedata) antes de comparar as descrições
+    ProcessosParalelos: int = 1  # 1 = sequencial; 0 = todos os núcleos (pool mantido durante a sessão)
+    PularFuzzyQuandoExato: bool = False  # Itens idênticos a uma referência recebem só as correspondências exatas
+    MaximoCandidatos: int = 50  # Top-K de referências por item (0 = sem limite); "Mostrar Mais" amplia
+    FiltrarPorGrandeza: bool = False  # Compara cada item só com referências da mesma grandeza da unidade (ConversorMedidas)
+    UsarIndiceEmDisco: bool = True  # Reaproveita o corpus de referência gravado em .cache_referencia/ ao lado da planilha
+    PisoTaxaSimilaridade: Optional[float] = None  # Scores guardados a partir deste piso: baixar a taxa até ele não recalcula (None = taxa - MARGEM_PISO de processamento.py)
+    BandasLSH: int = 32  # Motor "minhash": mais bandas = mais recall (e mais candidatos)
+    LinhasLSH: int = 3  # Motor "minhash": mais linhas por banda = menos candidatos (e menos recall)
+    MedirRecallLSH: bool = False  # Motor "minhash": mede o recall contra o score exato em uma amostra do orçamento e registra no log
+    PrazoSegundos: float = 0  # Tempo máximo do processamento; esgotado, retorna as linhas já correlacionadas (0 = sem prazo)
+    Pontuador: str = ""  # Pontuador de pontuadores.py para Correlacionador, motor "rapidfuzz" e 1º estágio do "rerank" ("" = padrão de cada um)
+    CandidatosRerank: int = 50  # Motor "rerank": candidatos por item do pontuador barato que recebem o score exato
+    ComprimentoMaximoComparado: int = 0  # Descrições maiores são comparadas pela versão reduzida (início + termos-chave; 0 = sem limite)
+    TempoMaximoPar: float = 0  # Segundos por par; acima disso o lado mais longo passa a ser comparado reduzido, se for maior que a versão reduzida (0 = sem guarda)
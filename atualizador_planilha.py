@@ -8,9 +8,10 @@ from datetime import datetime
 from pathlib import Path
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 import sys
+from progresso import Progresso
 
 # Configurar logging
 Path("logs").mkdir(exist_ok=True)
@@ -82,7 +83,7 @@ class AtualizadorPlanilha:
         novo_nome = f"{base.stem}_PREENCHIDA_{timestamp}{base.suffix}"
         return str(base.parent / novo_nome)
     
-    def atualizar_com_selecoes(self, selecoes: List[Dict], caminho_destino: str = None) -> str:
+    def atualizar_com_selecoes(self, selecoes: List[Dict], caminho_destino: str = None, progresso: Optional[Progresso] = None) -> str:
         """
         Atualiza a planilha com os itens selecionados.
         
@@ -96,6 +97,8 @@ class AtualizadorPlanilha:
                 "unidade": unidade de medida
             }
             caminho_destino: Onde salvar (se None, usa timestamp automático)
+            progresso: Avança a cada seleção; cancelado ou com prazo esgotado, para
+                e salva só as linhas já preenchidas (motivo em progresso.interrompido)
         
         Returns:
             Caminho do arquivo salvo
@@ -114,7 +117,14 @@ class AtualizadorPlanilha:
         
         # Atualizar células
         atualizacoes = 0
+        if progresso is not None:
+            progresso.iniciar(len(selecoes))
         for selecao in selecoes:
+            if progresso is not None:
+                if progresso.deve_parar:
+                    logger.warning(f"Atualizacao interrompida ({progresso.interrompido}): salvando as linhas ja preenchidas")
+                    break
+                progresso.avancar()
             numero_linha = selecao.get("numero_linha")
             
             if not numero_linha:
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tempo de leitura das planilhas por backend de leitura_planilhas.
+
+Uso:
+    python benchmark_leitura.py [planilha ...]
+
+Sem argumentos, mede as planilhas de exemplo do repositório. Cada planilha é
+lida inteira (primeira aba) por todos os backends instalados que leem a sua
+extensão; as planilhas Excel também são exportadas para um CSV temporário,
+para comparar com o backend de CSV; com `pyarrow`, também é medida a leitura
+pelo cache de planilhas já preenchido. O tempo é o menor de REPETICOES leituras.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cache_planilhas
+from leitura_planilhas import BACKENDS, ORDEM_PREFERENCIA, backend_disponivel, escolher_backend, ler_tabela
+
+REPETICOES = 3
+
+PLANILHAS_EXEMPLO = ("PlanilhaReferencia.xlsx", "PlanilhaOrçamento.xlsx")
+
+
+def medir(caminho: str, backend: str = None, usar_cache: bool = False) -> tuple:
+    """(menor tempo em segundos, linhas lidas)"""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        dados = ler_tabela(caminho, backend=backend, usar_cache=usar_cache)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), len(dados)
+
+
+def medir_planilha(caminho: str, pasta_temporaria: str):
+    extensao = Path(caminho).suffix.lower()
+    print(f"\n{Path(caminho).name} (automático: {escolher_backend(caminho)})")
+    for backend in ORDEM_PREFERENCIA:
+        if extensao not in BACKENDS[backend]:
+            continue
+        if not backend_disponivel(backend):
+            print(f"  {backend:<10} não instalado")
+            continue
+        segundos, linhas = medir(caminho, backend)
+        print(f"  {backend:<10} {segundos * 1000:9.1f} ms  ({linhas} linhas)")
+
+    if cache_planilhas.disponivel():
+        ler_tabela(caminho)  # Preenche o cache
+        segundos, linhas = medir(caminho, usar_cache=True)
+        print(f"  {'cache':<10} {segundos * 1000:9.1f} ms  ({linhas} linhas)")
+
+    if extensao not in BACKENDS["csv"]:
+        exportado = Path(pasta_temporaria) / (Path(caminho).stem + ".csv")
+        ler_tabela(caminho, usar_cache=False).to_csv(exportado, header=False, index=False)
+        segundos, linhas = medir(str(exportado), "csv")
+        print(f"  {'csv':<10} {segundos * 1000:9.1f} ms  ({linhas} linhas, exportado)")
+
+
+def main(caminhos):
+    if not caminhos:
+        pasta = Path(__file__).resolve().parent
+        caminhos = [str(pasta / nome) for nome in PLANILHAS_EXEMPLO if (pasta / nome).exists()]
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        for caminho in caminhos:
+            medir_planilha(caminho, pasta_temporaria)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,288 @@
+"""
+Cache em disco das planilhas já lidas, em Arrow ao lado do arquivo.
+
+Ler um .xlsx é o maior custo fixo de cada execução, e as mesmas planilhas são
+relidas sem mudar (ex.: "Avançar" duas vezes em FormBuscaPlanilhas). Cada aba
+lida (ver `leitura_planilhas.ler_tabela`: as células brutas, antes da
+conversão de tipos do pandas) é gravada em `.cache_planilhas/`, uma entrada
+por arquivo e aba, como Arrow IPC sem compressão; as próximas leituras abrem o
+arquivo por memory-map, sem reler a planilha.
+
+Formato: cada coluna é gravada no tipo nativo do Arrow (número, texto, data);
+uma coluna com valores de tipos diferentes vira uma união esparsa (inteiro,
+real, booleano, texto, data e hora, com o restante convertido em texto), que
+volta com os mesmos valores e tipos. Nada é serializado com pickle: abrir um
+cache alheio não executa código.
+
+Validade: a entrada guarda tamanho, mtime e hash do conteúdo da planilha. Com
+tamanho e mtime iguais ela é usada sem reler a planilha; com o mesmo tamanho e
+outro mtime, o hash decide (cópias e "salvar" sem mudanças continuam valendo);
+qualquer outra mudança descarta a entrada. A pasta tem tamanho máximo: ao
+passar dele, saem as entradas usadas há mais tempo (LRU pelo mtime do arquivo
+de cache, atualizado a cada uso).
+
+Exige `pyarrow`; sem ele as planilhas são lidas sem cache.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+from datetime import datetime, time
+from importlib.util import find_spec
+from numbers import Integral, Real
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from cache_referencia import hash_arquivo
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato gravado mudar
+VERSAO_CACHE = 4
+
+DIRETORIO_CACHE = ".cache_planilhas"
+
+# Tamanho máximo de cada pasta de cache (bytes)
+TAMANHO_MAXIMO_CACHE = 256 * 1024 * 1024
+
+# False desliga o cache (ex.: para medir a leitura da planilha)
+HABILITADO = True
+
+
+def disponivel() -> bool:
+    return HABILITADO and find_spec("pyarrow") is not None
+
+
+def caminho_cache(caminho_planilha: str, aba: Union[str, int]) -> Path:
+    caminho = Path(caminho_planilha).resolve()
+    chave = hashlib.sha1(
+        "\0".join([str(VERSAO_CACHE), str(caminho), str(aba)]).encode("utf-8")
+    ).hexdigest()
+    return caminho.parent / DIRETORIO_CACHE / f"{caminho.stem}.{chave[:16]}.arrow"
+
+
+def consultar(caminho_planilha: str, aba: Union[str, int]) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """(dados, info) gravados por `gravar`, se a entrada existir e ainda valer; None senão (nunca lê a planilha)"""
+    arquivo = caminho_cache(caminho_planilha, aba)
+    if not disponivel() or not arquivo.exists():
+        return None
+    try:
+        return _carregar(arquivo, caminho_planilha, os.stat(caminho_planilha))
+    except Exception as e:
+        logger.warning(f"Cache da planilha ignorado: {e}")
+        return None
+
+
+def gravar(caminho_planilha: str, aba: Union[str, int], dados: pd.DataFrame, info: dict, estado: os.stat_result):
+    """
+    Grava `dados` como a entrada da aba, com `info` (JSON) junto. `estado` é o
+    os.stat da planilha antes da leitura. Sem pyarrow, não faz nada.
+    """
+    if disponivel():
+        _gravar(caminho_cache(caminho_planilha, aba), dados, info, estado, hash_arquivo(caminho_planilha))
+
+
+def _carregar(arquivo: Path, caminho_planilha: str, estado: os.stat_result) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """(DataFrame, info) se a entrada vale para a planilha atual; None senão"""
+    import pyarrow as pa
+
+    tabela = pa.ipc.open_file(pa.memory_map(str(arquivo), "r")).read_all()
+    metadados = tabela.schema.metadata
+    if int(metadados[b"tamanho"]) != estado.st_size:
+        return None
+
+    if int(metadados[b"mtime_ns"]) != estado.st_mtime_ns:
+        if hash_arquivo(caminho_planilha) != metadados[b"hash"].decode():
+            return None
+        # Mesmo conteúdo com outro mtime: regrava os metadados para não recalcular o hash
+        _gravar_tabela(arquivo, tabela.replace_schema_metadata(
+            {**metadados, b"mtime_ns": str(estado.st_mtime_ns).encode()}
+        ))
+
+    os.utime(arquivo)  # Ordem do LRU
+    return _para_dataframe(tabela)
+
+
+def _gravar(arquivo: Path, dados: pd.DataFrame, info: dict, estado: os.stat_result, hash_conteudo: str):
+    """Grava a entrada e aplica o tamanho máximo; falhas (ex.: pasta somente leitura) só geram aviso"""
+    try:
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+        _gravar_tabela(arquivo, _para_tabela(dados, info, {
+            b"tamanho": str(estado.st_size).encode(),
+            b"mtime_ns": str(estado.st_mtime_ns).encode(),
+            b"hash": hash_conteudo.encode(),
+        }))
+        limitar_tamanho(arquivo.parent)
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o cache da planilha: {e}")
+
+
+def _gravar_tabela(arquivo: Path, tabela):
+    import pyarrow as pa
+
+    # Grava em arquivo temporário e renomeia: uma entrada incompleta nunca é lida
+    descritor, temporario = tempfile.mkstemp(dir=arquivo.parent, prefix=".tmp_", suffix=".arrow")
+    os.close(descritor)
+    try:
+        with pa.OSFile(temporario, "wb") as destino, pa.ipc.new_file(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        os.replace(temporario, arquivo)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def limitar_tamanho(diretorio: Path, tamanho_maximo: int = TAMANHO_MAXIMO_CACHE):
+    """Remove as entradas usadas há mais tempo até a pasta caber em `tamanho_maximo`"""
+    entradas = []
+    for arquivo in diretorio.glob("*.arrow"):
+        try:
+            estado = arquivo.stat()
+        except OSError:
+            continue
+        entradas.append((estado.st_mtime_ns, estado.st_size, arquivo))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, arquivo in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        try:
+            arquivo.unlink()
+            total -= tamanho
+        except OSError:
+            continue  # Em uso (ex.: mapeado em memória no Windows)
+
+
+# Filhos da união esparsa das colunas com tipos misturados (código = posição)
+_TIPOS_MISTOS = ("inteiro", "real", "booleano", "texto", "data", "hora")
+
+
+def _para_tabela(dados: pd.DataFrame, info: dict, metadados: dict):
+    """DataFrame -> tabela Arrow, coluna a coluna no tipo nativo (ver `_coluna_arrow`)"""
+    import pyarrow as pa
+
+    arrays, mistas = [], []
+    for posicao in range(dados.shape[1]):
+        array, mista = _coluna_arrow(dados.iloc[:, posicao])
+        arrays.append(array)
+        if mista:
+            mistas.append(posicao)
+
+    return pa.Table.from_arrays(
+        arrays,
+        names=[f"c{posicao}" for posicao in range(len(arrays))],
+        metadata={
+            **metadados,
+            b"formato": json.dumps({
+                "rotulos": [_valor_json(rotulo) for rotulo in dados.columns],
+                "tipos": [str(tipo) for tipo in dados.dtypes],
+                "mistas": mistas,
+                "info": info,
+            }).encode(),
+        }
+    )
+
+
+def _coluna_arrow(serie: pd.Series):
+    """
+    (array Arrow, True se for união de tipos). Colunas numéricas, de datas e
+    só de texto (ou só de inteiros, sem vazios) usam o tipo nativo; as demais
+    viram união esparsa, com vazios como real NaN (como no pandas).
+    """
+    import pyarrow as pa
+
+    if serie.dtype != object:
+        return pa.Array.from_pandas(serie), False
+    valores = serie.tolist()
+    preenchidos = [valor for valor in valores if not _vazio(valor)]
+    if all(isinstance(valor, str) for valor in preenchidos):
+        return pa.array([None if _vazio(valor) else valor for valor in valores], pa.string()), False
+    if len(preenchidos) == len(valores) and all(_tipo_misto(valor) == 0 for valor in valores):
+        return pa.array(valores, pa.int64()), False
+
+    codigos = [1 if _vazio(valor) else _tipo_misto(valor) for valor in valores]
+    filhos = [[None] * len(valores) for _ in _TIPOS_MISTOS]
+    for linha, (codigo, valor) in enumerate(zip(codigos, valores)):
+        filhos[codigo][linha] = (
+            int(valor) if codigo == 0 else
+            float(valor) if codigo == 1 else
+            bool(valor) if codigo == 2 else
+            str(valor) if codigo == 3 else
+            valor
+        )
+    tipos = (pa.int64(), pa.float64(), pa.bool_(), pa.string(), pa.timestamp("us"), pa.time64("us"))
+    return pa.UnionArray.from_sparse(
+        pa.array(codigos, pa.int8()),
+        [pa.array(filho, tipo) for filho, tipo in zip(filhos, tipos)],
+        list(_TIPOS_MISTOS)
+    ), True
+
+
+def _tipo_misto(valor) -> int:
+    """Posição do valor em _TIPOS_MISTOS (tipos que não estão lá são gravados como texto)"""
+    if isinstance(valor, (bool, np.bool_)):
+        return 2
+    if isinstance(valor, Integral):
+        return 0
+    if isinstance(valor, Real):
+        return 1
+    if isinstance(valor, datetime):
+        return 4
+    if isinstance(valor, time):
+        return 5
+    return 3
+
+
+def _vazio(valor) -> bool:
+    return valor is None or valor is pd.NaT or (isinstance(valor, float) and math.isnan(valor))
+
+
+def _valor_json(valor):
+    """
+    Rótulo de coluna em JSON: texto, número, booleano ou vazio;
+    data e hora como {"data"|"hora": ISO}; o restante vira texto
+    """
+    if _vazio(valor):
+        return None
+    tipo = _tipo_misto(valor)
+    if tipo >= 4:
+        return {_TIPOS_MISTOS[tipo]: valor.isoformat()}
+    return (int, float, bool, str)[tipo](valor)
+
+
+def _de_json(valor):
+    """Inverso de `_valor_json` (vazio vira NaN)"""
+    if valor is None:
+        return np.nan
+    if isinstance(valor, dict):
+        if "data" in valor:
+            return datetime.fromisoformat(valor["data"])
+        return time.fromisoformat(valor["hora"])
+    return valor
+
+
+def _para_dataframe(tabela) -> Tuple[pd.DataFrame, dict]:
+    formato = json.loads(tabela.schema.metadata[b"formato"])
+    rotulos = [_de_json(rotulo) for rotulo in formato["rotulos"]]
+    mistas = set(formato["mistas"])
+
+    colunas = {}
+    for posicao, rotulo in enumerate(rotulos):
+        coluna = tabela.column(posicao)
+        if posicao in mistas:
+            colunas[rotulo] = pd.Series(coluna.to_pylist(), dtype=object)
+        else:
+            serie = coluna.to_pandas()
+            colunas[rotulo] = serie.where(serie.notna(), np.nan) if serie.dtype == object else serie
+    dados = pd.DataFrame(colunas, columns=rotulos, copy=False)
+    # Só uma coluna object de inteiros (ou de textos) volta com outro tipo
+    return dados.astype({
+        rotulo: object for rotulo, tipo in zip(rotulos, formato["tipos"])
+        if tipo == "object" and dados[rotulo].dtype != object
+    }), formato["info"]
@@ -0,0 +1,200 @@
+"""
+Índice persistente da planilha de referência.
+
+O catálogo de preços muda raramente (ex.: SINAPI mensal), então o corpus já
+validado e normalizado é gravado em disco ao lado da planilha, em
+`.cache_referencia/`. A chave combina o hash do conteúdo do arquivo, a aba, as
+letras das colunas e a normalização; qualquer mudança gera uma nova entrada.
+
+Os valores numéricos ficam em arquivos `.npy`, abertos com `mmap_mode="r"`:
+uma sessão com o índice "quente" não passa pelo `pd.read_excel`. Os textos
+(UTF-8 + deslocamentos) e os índices de n-gramas também são `.npy`, lidos com
+`allow_pickle=False`: a pasta fica ao lado da planilha (ex.: compartilhada na
+rede) e carregá-la não pode executar código. Configurações diferentes da
+mesma planilha (aba, colunas, acentos) convivem; ao gravar, saem as entradas
+do mesmo arquivo (caminho completo) com conteúdo antigo e, passando de
+TAMANHO_MAXIMO_CACHE, as usadas há mais tempo (LRU pelo mtime da pasta).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from corpus_referencia import CorpusReferencia
+from indice_ngramas import IndiceNGramas
+from parametrosPlanilha import ParametrosPlanilhas
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato gravado ou a validação das referências mudar
+VERSAO_INDICE = 3
+
+DIRETORIO_CACHE = ".cache_referencia"
+
+# Tamanho máximo da pasta de cache (bytes)
+TAMANHO_MAXIMO_CACHE = 512 * 1024 * 1024
+
+# Arquivo de cada entrada com o caminho e o hash da planilha de origem
+_ORIGEM = "origem.json"
+
+_COLUNAS_NUMERICAS = ("valores_material", "valores_mao_de_obra", "numeros_linha")
+
+_COLUNAS_TEXTO = ("descricoes", "descricoes_normalizadas", "unidades")
+
+_PREFIXO_INDICE_NGRAMAS = "indice_ngramas."
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-1 do conteúdo do arquivo (lido em blocos)"""
+    h = hashlib.sha1()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def chave_indice(planilha: ParametrosPlanilhas, remover_acentos: bool, hash_conteudo: Optional[str] = None) -> str:
+    """Chave do índice: conteúdo do arquivo + aba + mapeamento de colunas + normalização"""
+    partes = [
+        str(VERSAO_INDICE),
+        hash_conteudo or hash_arquivo(planilha.caminho_planilha),
+        str(planilha.aba),
+        planilha.coluna_descrição.upper(),
+        planilha.coluna_material.upper(),
+        planilha.coluna_mao_de_obra.upper(),
+        planilha.coluna_unidade_medida.upper(),
+        str(remover_acentos),
+    ]
+    return hashlib.sha1("\0".join(partes).encode("utf-8")).hexdigest()
+
+
+def diretorio_indice(planilha: ParametrosPlanilhas, chave: str) -> Path:
+    caminho = Path(planilha.caminho_planilha)
+    return caminho.parent / DIRETORIO_CACHE / f"{caminho.name}.{chave[:16]}"
+
+
+def carregar_corpus(planilha: ParametrosPlanilhas, remover_acentos: bool) -> Optional[CorpusReferencia]:
+    """Carrega o corpus do índice em disco, ou None se não existir (ou estiver ilegível)"""
+    try:
+        diretorio = diretorio_indice(planilha, chave_indice(planilha, remover_acentos))
+        if not diretorio.is_dir():
+            return None
+        os.utime(diretorio)  # Ordem do LRU
+
+        textos = {nome: _carregar_textos(diretorio, nome) for nome in _COLUNAS_TEXTO}
+        numericos = {
+            nome: np.load(diretorio / f"{nome}.npy", mmap_mode="r", allow_pickle=False)
+            for nome in _COLUNAS_NUMERICAS
+        }
+
+        # Um índice por tamanho de n-grama: indice_ngramas.{tamanho}.{array}.npy
+        arrays_por_tamanho: Dict[int, Dict[str, np.ndarray]] = {}
+        for arquivo in diretorio.glob(f"{_PREFIXO_INDICE_NGRAMAS}*.npy"):
+            tamanho, _, nome = arquivo.name[len(_PREFIXO_INDICE_NGRAMAS):-len(".npy")].partition(".")
+            arrays_por_tamanho.setdefault(int(tamanho), {})[nome] = np.load(arquivo, allow_pickle=False)
+        indices_ngramas = {
+            tamanho: IndiceNGramas.de_arrays(arrays) for tamanho, arrays in arrays_por_tamanho.items()
+        }
+
+        return CorpusReferencia.de_colunas(
+            textos["descricoes"],
+            textos["descricoes_normalizadas"],
+            numericos["valores_material"],
+            numericos["valores_mao_de_obra"],
+            textos["unidades"],
+            numericos["numeros_linha"],
+            remover_acentos=remover_acentos,
+            indices_ngramas=indices_ngramas
+        )
+    except Exception as e:
+        logger.warning(f"Índice de referência em disco ignorado: {e}")
+        return None
+
+
+def salvar_corpus(planilha: ParametrosPlanilhas, corpus: CorpusReferencia) -> bool:
+    """
+    Grava o corpus (e os índices de n-gramas já construídos) ao lado da
+    planilha. Falhas de escrita (ex.: pasta somente leitura) só geram aviso.
+    """
+    try:
+        hash_conteudo = hash_arquivo(planilha.caminho_planilha)
+        diretorio = diretorio_indice(planilha, chave_indice(planilha, corpus.remover_acentos, hash_conteudo))
+        diretorio.parent.mkdir(parents=True, exist_ok=True)
+        origem = {"caminho": str(Path(planilha.caminho_planilha).resolve()), "hash": hash_conteudo}
+
+        # Grava em pasta temporária e renomeia: um índice incompleto nunca é lido
+        temporario = Path(tempfile.mkdtemp(dir=diretorio.parent, prefix=".tmp_"))
+        try:
+            for nome in _COLUNAS_TEXTO:
+                _salvar_textos(temporario, nome, getattr(corpus, nome))
+            np.save(temporario / "valores_material.npy", np.asarray(corpus.valores_material, dtype=np.float64))
+            np.save(temporario / "valores_mao_de_obra.npy", np.asarray(corpus.valores_mao_de_obra, dtype=np.float64))
+            np.save(temporario / "numeros_linha.npy", np.asarray(corpus.numeros_linha, dtype=np.int64))
+            (temporario / _ORIGEM).write_text(json.dumps(origem), encoding="utf-8")
+            for tamanho, indice in corpus.indices_ngramas_construidos.items():
+                for nome, array in indice.para_arrays().items():
+                    np.save(temporario / f"{_PREFIXO_INDICE_NGRAMAS}{tamanho}.{nome}.npy", array)
+
+            if diretorio.exists():
+                shutil.rmtree(diretorio)
+            os.replace(temporario, diretorio)
+        finally:
+            shutil.rmtree(temporario, ignore_errors=True)
+        _remover_entradas_antigas(diretorio, origem)
+        return True
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o índice de referência: {e}")
+        return False
+
+
+def _remover_entradas_antigas(diretorio: Path, origem: dict, tamanho_maximo: int = TAMANHO_MAXIMO_CACHE):
+    """
+    Apaga as entradas do mesmo arquivo (caminho completo) gravadas com outro
+    conteúdo, que nunca mais seriam lidas, e depois as usadas há mais tempo
+    até a pasta caber em `tamanho_maximo` (a entrada recém-gravada fica).
+    """
+    entradas = []
+    for irmao in diretorio.parent.iterdir():
+        if not irmao.is_dir() or irmao == diretorio or irmao.name.startswith(".tmp_"):
+            continue
+        try:
+            origem_irmao = json.loads((irmao / _ORIGEM).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            origem_irmao = {}
+        if origem_irmao.get("caminho") == origem["caminho"] and origem_irmao.get("hash") != origem["hash"]:
+            shutil.rmtree(irmao, ignore_errors=True)  # Em uso (ex.: mapeado em memória no Windows): fica para a próxima
+            continue
+        entradas.append((irmao.stat().st_mtime_ns, _tamanho_pasta(irmao), irmao))
+
+    total = _tamanho_pasta(diretorio) + sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, irmao in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        shutil.rmtree(irmao, ignore_errors=True)
+        total -= tamanho
+
+
+def _tamanho_pasta(diretorio: Path) -> int:
+    return sum(arquivo.stat().st_size for arquivo in diretorio.iterdir() if arquivo.is_file())
+
+
+def _salvar_textos(diretorio: Path, nome: str, textos: List[str]):
+    """Textos como bytes UTF-8 concatenados (`{nome}.npy`) + fim de cada um (`{nome}.fim.npy`)"""
+    codificados = [texto.encode("utf-8", "surrogatepass") for texto in textos]
+    fim = np.zeros(len(codificados) + 1, dtype=np.int64)
+    fim[1:] = np.cumsum([len(codificado) for codificado in codificados])
+    np.save(diretorio / f"{nome}.npy", np.frombuffer(b"".join(codificados), dtype=np.uint8))
+    np.save(diretorio / f"{nome}.fim.npy", fim)
+
+
+def _carregar_textos(diretorio: Path, nome: str) -> List[str]:
+    dados = np.load(diretorio / f"{nome}.npy", allow_pickle=False).tobytes()
+    fim = np.load(diretorio / f"{nome}.fim.npy", allow_pickle=False).tolist()
+    return [dados[fim[i]:fim[i + 1]].decode("utf-8", "surrogatepass") for i in range(len(fim) - 1)]
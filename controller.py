@@ -18,7 +18,7 @@ class Controller:
         """
         file_path = filedialog.askopenfilename(
             title=f"Selecione a {'Planilha de Orçamento' if tipo == 1 else 'Planilha de Referência'}",
-            filetypes=[("Arquivos Excel", "*.xlsx")]
+            filetypes=[("Arquivos Excel", "*.xlsx"), ("Catálogos CSV", "*.csv")]
         )
         
         if file_path:
@@ -34,7 +34,7 @@ class Controller:
         Inicia o processo de mesclagem e atualiza a GUI.
         """
         self.view.update_log("Iniciando a análise e busca por correspondências...")
-        if self.model.mesclar_planilhas():
+        if self.model.mesclar_planilhas(um_para_um=self.view.var_um_para_um.get()):
             self.view.exibir_janelas_resultados(self.model.correspondencias_df)
             self.view.update_log(f"Análise concluída. {len(self.model.correspondencias_df)} correspondências encontradas.")
             if not self.model.correspondencias_df.empty:
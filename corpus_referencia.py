@@ -0,0 +1,301 @@
+import hashlib
+import math
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from ConversorMedidas import ConversorMedidas, GrandezaFisica
+from indice_ngramas import IndiceNGramas
+
+
+def normalizar_descricao(texto: str, remover_acentos: bool = False) -> str:
+    """
+    Normaliza uma descrição para comparação: remove espaços nas pontas e
+    converte para minúsculas. Com `remover_acentos`, também remove os acentos
+    (decomposição NFKD do unicodedata, descartando as marcas combinantes).
+    """
+    texto = str(texto).strip().lower()
+    if remover_acentos:
+        texto = "".join(
+            caractere for caractere in unicodedata.normalize("NFKD", texto)
+            if not unicodedata.combining(caractere)
+        )
+    return texto
+
+
+def ratio_com_corte(matcher: SequenceMatcher, taxa: float) -> Optional[float]:
+    """
+    Retorna `matcher.ratio()` só se ele ainda puder ser maior que `taxa`.
+
+    Antes do ratio() completo testa os limites superiores baratos do difflib:
+    real_quick_ratio() (limite de comprimento 2*min(la, lb)/(la + lb)) e
+    quick_ratio() (interseção dos caracteres). Os três usam o mesmo
+    denominador, então o corte é exato: quando devolve None, ratio() <= taxa.
+    """
+    if matcher.real_quick_ratio() <= taxa:
+        return None
+    if matcher.quick_ratio() <= taxa:
+        return None
+    return matcher.ratio()
+
+
+# Comprimento da versão reduzida quando só a guarda de tempo por par está ativa
+COMPRIMENTO_REDUZIDO_PADRAO = 256
+
+
+def reduzir_descricao(texto: str, comprimento_maximo: int) -> str:
+    """
+    Versão de custo limitado de uma descrição longa (ex.: especificação técnica
+    completa): o início do texto (metade do limite) seguido dos termos-chave do
+    restante, sem repetição (com dígitos, como bitolas e dimensões, ou com 4+
+    letras), até `comprimento_maximo` caracteres.
+    """
+    if len(texto) <= comprimento_maximo:
+        return texto
+    prefixo = texto[:comprimento_maximo // 2]
+    if " " in prefixo and not texto[len(prefixo)].isspace():
+        prefixo = prefixo.rsplit(" ", 1)[0]  # Não corta um termo no meio
+    vistos = set(prefixo.split())
+    partes = [prefixo.rstrip()]
+    tamanho = len(partes[0])
+    for termo in texto[len(prefixo):].split():
+        if termo in vistos or not (len(termo) >= 4 or any(caractere.isdigit() for caractere in termo)):
+            continue
+        if tamanho + 1 + len(termo) > comprimento_maximo:
+            break
+        vistos.add(termo)
+        partes.append(termo)
+        tamanho += 1 + len(termo)
+    return " ".join(partes)
+
+
+class CorpusReferencia:
+    """
+    Referências válidas da planilha de preços, pré-processadas uma única vez
+    por execução (descrição normalizada, valores numéricos, unidade e linha).
+
+    Mantém um SequenceMatcher por referência com a descrição da referência como
+    segunda sequência: o difflib guarda em cache a tabela `b2j` da segunda
+    sequência, então cada item do orçamento só precisa de `set_seq1`.
+    """
+
+    def __init__(self, remover_acentos: bool = False):
+        self.remover_acentos = remover_acentos
+        self.descricoes: List[str] = []
+        self.descricoes_normalizadas: List[str] = []
+        # Colunas numéricas compactas (8 bytes por valor, sem um objeto Python por célula)
+        self.valores_material: Sequence[float] = array("d")
+        self.valores_mao_de_obra: Sequence[float] = array("d")
+        self.unidades: List[str] = []
+        self.numeros_linha: Sequence[int] = array("q")
+        self._matchers: List[Optional[SequenceMatcher]] = []
+        self._indices_ngramas: Dict[int, IndiceNGramas] = {}
+        self._ordem_por_comprimento: Optional[List[int]] = None
+        self._comprimentos_ordenados: List[int] = []
+        self._posicoes_por_descricao: Optional[Dict[str, List[int]]] = None
+        self._particoes: Optional[Dict[GrandezaFisica, Tuple["CorpusReferencia", List[int]]]] = None
+        self._assinatura: Optional[str] = None
+        # Guarda de custo para descrições longas (ver similaridade_limitada)
+        self._matchers_reduzidos: Dict[Tuple[int, int], SequenceMatcher] = {}
+        self.posicoes_pesadas: Set[int] = set()  # Referências com um par acima da guarda de tempo
+        self.posicoes_reduzidas: Set[int] = set()  # Referências comparadas pela versão reduzida
+        self.consultas_reduzidas: Set[str] = set()  # Descrições do orçamento comparadas pela versão reduzida
+
+    @classmethod
+    def de_colunas(
+        cls,
+        descricoes: List[str],
+        descricoes_normalizadas: List[str],
+        valores_material,
+        valores_mao_de_obra,
+        unidades: List[str],
+        numeros_linha,
+        remover_acentos: bool = False,
+        indices_ngramas: Optional[Dict[int, IndiceNGramas]] = None
+    ) -> "CorpusReferencia":
+        """
+        Monta o corpus a partir de colunas já processadas (ex.: índice persistido
+        em disco). Os valores podem ser arrays numpy mapeados em memória.
+        """
+        corpus = cls(remover_acentos)
+        corpus.descricoes = descricoes
+        corpus.descricoes_normalizadas = descricoes_normalizadas
+        corpus.valores_material = valores_material
+        corpus.valores_mao_de_obra = valores_mao_de_obra
+        corpus.unidades = unidades
+        corpus.numeros_linha = numeros_linha
+        corpus._matchers = [None] * len(descricoes)
+        corpus._indices_ngramas = dict(indices_ngramas or {})
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.descricoes)
+
+    def __getstate__(self):
+        # Ao enviar o corpus para outro processo, não copia os caches (são reconstruídos sob demanda)
+        estado = self.__dict__.copy()
+        estado["_matchers"] = [None] * len(self.descricoes)
+        estado["_indices_ngramas"] = {}
+        estado["_ordem_por_comprimento"] = None
+        estado["_comprimentos_ordenados"] = []
+        estado["_posicoes_por_descricao"] = None
+        estado["_particoes"] = None
+        estado["_assinatura"] = None
+        estado["_matchers_reduzidos"] = {}
+        return estado
+
+    def adicionar(self, descricao: str, valor_material: float, valor_mao_de_obra: float, unidade: str, numero_linha: int):
+        """Adiciona uma referência já validada ao corpus"""
+        self.descricoes.append(descricao)
+        self.descricoes_normalizadas.append(self.normalizar(descricao))
+        self.valores_material.append(valor_material)
+        self.valores_mao_de_obra.append(valor_mao_de_obra)
+        self.unidades.append(unidade)
+        self.numeros_linha.append(numero_linha)
+        self._matchers.append(None)
+        self._indices_ngramas = {}
+        self._ordem_por_comprimento = None
+        self._posicoes_por_descricao = None
+        self._particoes = None
+        self._assinatura = None
+
+    def normalizar(self, texto: str) -> str:
+        """Aplica ao texto a mesma normalização usada nas descrições do corpus"""
+        return normalizar_descricao(texto, self.remover_acentos)
+
+    def indice_ngramas(self, taxa: float) -> Optional[IndiceNGramas]:
+        """
+        Índice de n-gramas das descrições normalizadas no tamanho que descarta
+        pares nessa taxa (IndiceNGramas.tamanho_para), construído na primeira
+        consulta. None quando nenhum tamanho descartaria nada (taxa <= 2/3).
+        """
+        tamanho = IndiceNGramas.tamanho_para(taxa)
+        if tamanho is None:
+            return None
+        if tamanho not in self._indices_ngramas:
+            self._indices_ngramas[tamanho] = IndiceNGramas(self.descricoes_normalizadas, tamanho)
+        return self._indices_ngramas[tamanho]
+
+    def assinatura(self) -> str:
+        """Hash das descrições normalizadas (versão do corpus para os caches de correlação)"""
+        if self._assinatura is None:
+            h = hashlib.sha1()
+            h.update(str(self.remover_acentos).encode())
+            for descricao in self.descricoes_normalizadas:
+                h.update(descricao.encode("utf-8", "surrogatepass"))
+                h.update(b"\0")
+            self._assinatura = h.hexdigest()
+        return self._assinatura
+
+    @property
+    def indices_ngramas_construidos(self) -> Dict[int, IndiceNGramas]:
+        """Índices de n-gramas já construídos, por tamanho (sem construir nenhum)"""
+        return dict(self._indices_ngramas)
+
+    def subconjunto(self, posicoes: List[int]) -> "CorpusReferencia":
+        """Novo corpus só com as referências das posições informadas (na mesma ordem)"""
+        corpus = CorpusReferencia(self.remover_acentos)
+        for posicao in posicoes:
+            corpus.adicionar(
+                self.descricoes[posicao],
+                self.valores_material[posicao],
+                self.valores_mao_de_obra[posicao],
+                self.unidades[posicao],
+                self.numeros_linha[posicao]
+            )
+        return corpus
+
+    def particionar_por_grandeza(self) -> Dict[GrandezaFisica, Tuple["CorpusReferencia", List[int]]]:
+        """
+        Divide o corpus pela grandeza física da unidade (MASSA, VOLUME, COMPRIMENTO,
+        AREA, UNIDADE), uma única vez. Cada grandeza vira um corpus próprio, com
+        índice e matchers próprios, acompanhado das posições no corpus completo.
+        Referências com unidade não identificada ficam fora de todas as partições.
+        """
+        if self._particoes is None:
+            conversor = ConversorMedidas()
+            posicoes_por_grandeza: Dict[GrandezaFisica, List[int]] = {}
+            for posicao, unidade in enumerate(self.unidades):
+                grandeza = conversor.identificar_grandeza(str(unidade))
+                if grandeza != GrandezaFisica.NAO_IDENTIFICADA:
+                    posicoes_por_grandeza.setdefault(grandeza, []).append(posicao)
+            self._particoes = {
+                grandeza: (self.subconjunto(posicoes), posicoes)
+                for grandeza, posicoes in posicoes_por_grandeza.items()
+            }
+        return self._particoes
+
+    def posicoes_exatas(self, descricao_normalizada: str) -> List[int]:
+        """Posições das referências cuja descrição normalizada é idêntica à informada"""
+        if self._posicoes_por_descricao is None:
+            self._posicoes_por_descricao = {}
+            for posicao, descricao in enumerate(self.descricoes_normalizadas):
+                self._posicoes_por_descricao.setdefault(descricao, []).append(posicao)
+        return self._posicoes_por_descricao.get(descricao_normalizada, [])
+
+    def janela_comprimento(self, comprimento: int, taxa: float) -> List[int]:
+        """
+        Posições (em ordem crescente) das referências cujo comprimento ainda
+        permite similaridade > taxa com uma descrição de `comprimento` caracteres:
+        2*min(la, lb)/(la + lb) > taxa  =>  la*taxa/(2-taxa) < lb < la*(2-taxa)/taxa
+        """
+        if self._ordem_por_comprimento is None:
+            self._ordem_por_comprimento = sorted(
+                range(len(self.descricoes_normalizadas)),
+                key=lambda posicao: len(self.descricoes_normalizadas[posicao])
+            )
+            self._comprimentos_ordenados = [len(self.descricoes_normalizadas[p]) for p in self._ordem_por_comprimento]
+
+        if taxa <= 0:
+            return list(range(len(self)))
+
+        # Janela arredondada para fora; o corte exato fica com real_quick_ratio()
+        minimo = math.floor(comprimento * taxa / (2 - taxa))
+        maximo = math.ceil(comprimento * (2 - taxa) / taxa)
+        inicio = bisect_left(self._comprimentos_ordenados, minimo)
+        fim = bisect_right(self._comprimentos_ordenados, maximo)
+        return sorted(self._ordem_por_comprimento[inicio:fim])
+
+    def matcher(self, posicao: int) -> SequenceMatcher:
+        """SequenceMatcher reutilizável da referência na posição informada"""
+        matcher = self._matchers[posicao]
+        if matcher is None:
+            matcher = SequenceMatcher(None, "", self.descricoes_normalizadas[posicao])
+            self._matchers[posicao] = matcher
+        return matcher
+
+    def similaridade(self, descricao_normalizada: str, posicao: int) -> float:
+        """Mesmo valor de SequenceMatcher(None, descricao, referencia).ratio()"""
+        matcher = self.matcher(posicao)
+        matcher.set_seq1(descricao_normalizada)
+        return matcher.ratio()
+
+    def similaridade_com_corte(self, descricao_normalizada: str, posicao: int, taxa: float) -> Optional[float]:
+        """Como `similaridade`, mas devolve None quando um limite superior já garante score <= taxa"""
+        matcher = self.matcher(posicao)
+        matcher.set_seq1(descricao_normalizada)
+        return ratio_com_corte(matcher, taxa)
+
+    def similaridade_limitada(self, descricao_normalizada: str, posicao: int, taxa: float, comprimento_maximo: int = 0) -> Optional[float]:
+        """
+        Como `similaridade_com_corte`, mas a referência é comparada pela versão
+        reduzida (`reduzir_descricao`) quando passa de `comprimento_maximo`
+        caracteres ou já estourou a guarda de tempo (`posicoes_pesadas`). Só
+        referências maiores que a versão reduzida mudam (e entram em
+        `posicoes_reduzidas`); as demais são comparadas inteiras.
+        """
+        descricao_referencia = self.descricoes_normalizadas[posicao]
+        limite = comprimento_maximo or COMPRIMENTO_REDUZIDO_PADRAO
+        reduzir = comprimento_maximo or posicao in self.posicoes_pesadas
+        if not reduzir or len(descricao_referencia) <= limite:
+            return self.similaridade_com_corte(descricao_normalizada, posicao, taxa)
+
+        matcher = self._matchers_reduzidos.get((posicao, limite))
+        if matcher is None:
+            matcher = SequenceMatcher(None, "", reduzir_descricao(descricao_referencia, limite))
+            self._matchers_reduzidos[(posicao, limite)] = matcher
+        self.posicoes_reduzidas.add(posicao)
+        matcher.set_seq1(descricao_normalizada)
+        return ratio_com_corte(matcher, taxa)
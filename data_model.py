@@ -1,7 +1,101 @@
+import numpy as np
 import pandas as pd
-from rapidfuzz import process, fuzz
+from pontuadores import matriz_de_scores
+from leitura_planilhas import ler_tabela
 from tkinter import messagebox
 
+# Limite de células da matriz de scores por bloco
+CELULAS_POR_BLOCO = 20_000_000
+
+# Colunas lidas de cada planilha (índice 0-based do Excel): B = descrição; no orçamento
+# C = unidade e D = quantidade; na referência E = materiais e F = mão de obra
+COLUNAS_POR_TIPO = {
+    'orcamento': [1, 2, 3],
+    'referencia': [1, 4, 5],
+}
+
+
+class MatrizScores:
+    """
+    Pares (referência, orçamento) com score (0-100) >= match_threshold, calculados
+    uma única vez: respondem a melhor linha do orçamento de cada referência e a
+    atribuição um-para-um.
+
+    Os blocos adicionados ficam numa lista e são concatenados uma única vez, na
+    primeira consulta.
+    """
+    def __init__(self, indices_ref=None, indices_orc=None, scores=None):
+        self._indices_ref = np.empty(0, dtype=np.int64) if indices_ref is None else indices_ref
+        self._indices_orc = np.empty(0, dtype=np.int64) if indices_orc is None else indices_orc
+        self._scores = np.empty(0, dtype=np.float64) if scores is None else scores
+        self._blocos = []
+
+    def adicionar(self, indices_ref, indices_orc, scores):
+        self._blocos.append((indices_ref, indices_orc, scores))
+
+    @property
+    def indices_ref(self):
+        self._consolidar()
+        return self._indices_ref
+
+    @property
+    def indices_orc(self):
+        self._consolidar()
+        return self._indices_orc
+
+    @property
+    def scores(self):
+        self._consolidar()
+        return self._scores
+
+    def _consolidar(self):
+        if not self._blocos:
+            return
+        indices_ref, indices_orc, scores = zip(*self._blocos)
+        self._blocos = []
+        self._indices_ref = np.concatenate([self._indices_ref, *indices_ref])
+        self._indices_orc = np.concatenate([self._indices_orc, *indices_orc])
+        self._scores = np.concatenate([self._scores, *scores])
+
+    def _melhores(self, chave, outra):
+        # Ordena por chave, score decrescente e menor índice do outro lado (mesmo desempate do extractOne)
+        ordem = np.lexsort((outra, -self.scores, chave))
+        primeiros = np.ones(len(ordem), dtype=bool)
+        primeiros[1:] = chave[ordem][1:] != chave[ordem][:-1]
+        return ordem, primeiros
+
+    def melhor_orcamento_por_referencia(self):
+        """
+        Returns:
+            list: (idx_ref, idx_orc, score) com a melhor linha do orçamento de cada referência.
+        """
+        ordem, primeiros = self._melhores(self.indices_ref, self.indices_orc)
+        escolhidos = ordem[primeiros]
+        return list(zip(
+            self.indices_ref[escolhidos].tolist(),
+            self.indices_orc[escolhidos].tolist(),
+            self.scores[escolhidos].tolist()
+        ))
+
+    def atribuicao_um_para_um(self):
+        """
+        Atribuição gulosa: percorre os pares do maior para o menor score e aceita
+        o par se nem a referência nem a linha do orçamento já foram usadas.
+        Returns:
+            list: (idx_ref, idx_orc, score) em ordem de referência.
+        """
+        ordem = np.lexsort((self.indices_orc, self.indices_ref, -self.scores))
+        refs_usadas, orcs_usados, pares = set(), set(), []
+        for posicao in ordem.tolist():
+            idx_ref, idx_orc = int(self.indices_ref[posicao]), int(self.indices_orc[posicao])
+            if idx_ref in refs_usadas or idx_orc in orcs_usados:
+                continue
+            refs_usadas.add(idx_ref)
+            orcs_usados.add(idx_orc)
+            pares.append((idx_ref, idx_orc, float(self.scores[posicao])))
+        return sorted(pares)
+
+
 class DataModel:
     """
     Gerencia o estado dos dados da aplicação, incluindo os DataFrames
@@ -12,11 +106,13 @@ class DataModel:
         self.df_referencia = None
         self.correspondencias_df = pd.DataFrame()
         self.cesta_df = pd.DataFrame()
-        self.match_threshold = 85
+        self.match_threshold = 85  # Escala 0-100
+        self.pontuador = "wratio"  # Nome em pontuadores.PONTUADORES
+        self.matriz_scores = MatrizScores()
 
     def carregar_planilha(self, file_path, tipo):
         """
-        Carrega um arquivo Excel para o DataFrame correspondente.
+        Carrega um arquivo Excel (ou CSV) para o DataFrame correspondente.
         Args:
             file_path (str): O caminho do arquivo.
             tipo (str): 'orcamento' ou 'referencia'.
@@ -24,7 +120,10 @@ class DataModel:
             bool: True se o carregamento foi bem-sucedido, False caso contrário.
         """
         try:
-            df = pd.read_excel(file_path, header=None)
+            # Só as colunas usadas; os rótulos continuam sendo os índices das colunas no Excel
+            colunas = COLUNAS_POR_TIPO['orcamento' if tipo == 'orcamento' else 'referencia']
+            df = ler_tabela(file_path, colunas=set(colunas))
+            df = df.reindex(columns=colunas)
             if tipo == 'orcamento':
                 self.df_orcamento = df
             else:
@@ -34,50 +133,107 @@ class DataModel:
             messagebox.showerror("Erro de Leitura", f"Erro ao ler o arquivo: {str(e)}")
             return False
 
-    def mesclar_planilhas(self):
+    def mesclar_planilhas(self, um_para_um=False, progresso=None):
         """
         Executa a correspondência fuzzy entre as planilhas de orçamento e referência.
+        Args:
+            um_para_um (bool): Se True, cada linha do orçamento é usada por no máximo uma referência.
+            progresso (Progresso): Linhas da referência concluídas, cancelamento e prazo (opcional).
         """
         if self.df_orcamento is None or self.df_referencia is None:
             return False
 
-        descricoes_orc = self.df_orcamento.iloc[1:, 1].astype(str).dropna().tolist()
-        descricoes_ref = self.df_referencia.iloc[1:, 1].astype(str).dropna().tolist()
-        
-        resultados = []
-        for idx_ref, descricao_ref in enumerate(descricoes_ref):
-            if descricao_ref and descricao_ref.strip() != 'nan':
-                melhor_match = process.extractOne(
-                    descricao_ref,
-                    descricoes_orc,
-                    scorer=fuzz.WRatio,
-                    score_cutoff=self.match_threshold
-                )
-                
-                if melhor_match:
-                    descricao_orc, pontuacao, idx_orc = melhor_match
-                    
-                    linha_orc_original = self.df_orcamento.iloc[idx_orc + 1]
-                    linha_ref_original = self.df_referencia.iloc[idx_ref + 1]
-                    
-                    materiais = linha_ref_original.iloc[4]
-                    maodeobra = linha_ref_original.iloc[5]
-                    quantidade = linha_orc_original.iloc[3]
-                    
-                    resultados.append({
-                        "Numero_Linha": len(resultados) + 1, 
-                        "Descricao_Orcamento": str(linha_orc_original.iloc[1]),
-                        "Similaridade_Pontuacao": float(pontuacao),
-                        "Unidade_Orcamento": str(linha_orc_original.iloc[2]),
-                        "Quantidade_Orcamento": float(quantidade) if pd.notna(quantidade) else 0.0,
-                        "Materiais_Referencia": float(materiais) if pd.notna(materiais) else 0.0,
-                        "MaoDeObra_Referencia": float(maodeobra) if pd.notna(maodeobra) else 0.0,
-                        "Status_Correspondencia": "Correspondência Encontrada"
-                    })
-        
-        self.correspondencias_df = pd.DataFrame(resultados)
+        self.correspondencias_df = pd.DataFrame(list(self.iterar_correspondencias(um_para_um, progresso)))
         return True
 
+    def iterar_correspondencias(self, um_para_um=False, progresso=None):
+        """
+        Gera cada correspondência assim que ela é encontrada (mesmas colunas de
+        correspondencias_df), para consumir ou gravar sem montar a lista inteira.
+        Com `um_para_um`, os scores calculados ficam em `matriz_scores`; em
+        streaming cada bloco é descartado depois de entregue.
+        Args:
+            um_para_um (bool): Atribuição gulosa pelos maiores scores, sem repetir
+                linhas do orçamento (exige calcular todos os blocos antes).
+            progresso (Progresso): Avança a cada bloco de linhas da referência;
+                cancelado ou com prazo esgotado, para e mantém só os blocos já calculados.
+        Yields:
+            dict: Uma linha de correspondência.
+        """
+        if self.df_orcamento is None or self.df_referencia is None:
+            return
+
+        self.matriz_scores = MatrizScores()
+        if um_para_um:
+            for bloco in self._calcular_blocos_de_scores(progresso):
+                self.matriz_scores.adicionar(*bloco)
+            pares = self.matriz_scores.atribuicao_um_para_um()
+        else:
+            pares = self._melhores_por_bloco(progresso)
+
+        numero_linha = 0
+        for idx_ref, idx_orc, pontuacao in pares:
+            linha_orc_original = self.df_orcamento.iloc[idx_orc + 1]
+            linha_ref_original = self.df_referencia.iloc[idx_ref + 1]
+
+            materiais = linha_ref_original[4]
+            maodeobra = linha_ref_original[5]
+            quantidade = linha_orc_original[3]
+
+            numero_linha += 1
+            yield {
+                "Numero_Linha": numero_linha, 
+                "Descricao_Orcamento": str(linha_orc_original[1]),
+                "Similaridade_Pontuacao": float(pontuacao),
+                "Unidade_Orcamento": str(linha_orc_original[2]),
+                "Quantidade_Orcamento": float(quantidade) if pd.notna(quantidade) else 0.0,
+                "Materiais_Referencia": float(materiais) if pd.notna(materiais) else 0.0,
+                "MaoDeObra_Referencia": float(maodeobra) if pd.notna(maodeobra) else 0.0,
+                "Status_Correspondencia": "Correspondência Encontrada"
+            }
+
+    def _melhores_por_bloco(self, progresso=None):
+        """Melhor linha do orçamento por referência, entregue a cada bloco calculado"""
+        for bloco in self._calcular_blocos_de_scores(progresso):
+            yield from MatrizScores(*bloco).melhor_orcamento_por_referencia()
+
+    def _calcular_blocos_de_scores(self, progresso=None):
+        """
+        Calcula a matriz de scores referência × orçamento (pontuador escolhido,
+        escala 0-100) uma única vez, em blocos de linhas da referência.
+        Yields:
+            tuple: (índices da referência, índices do orçamento, scores) dos pares >= match_threshold.
+        """
+        descricoes_orc = self.df_orcamento[1].iloc[1:].astype(str).dropna().tolist()
+        descricoes_ref = self.df_referencia[1].iloc[1:].astype(str).dropna().tolist()
+        if not descricoes_orc:
+            return
+
+        indices_ref = np.array(
+            [idx for idx, descricao in enumerate(descricoes_ref) if descricao and descricao.strip() != 'nan'],
+            dtype=np.int64
+        )
+        linhas_por_bloco = max(1, CELULAS_POR_BLOCO // len(descricoes_orc))
+        if progresso is not None:
+            progresso.iniciar(len(indices_ref))
+
+        for inicio in range(0, len(indices_ref), linhas_por_bloco):
+            if progresso is not None and progresso.deve_parar:
+                return
+            indices_bloco = indices_ref[inicio:inicio + linhas_por_bloco]
+            matriz = matriz_de_scores(
+                self.pontuador,
+                [descricoes_ref[idx] for idx in indices_bloco],
+                descricoes_orc,
+                self.match_threshold,
+                escala=100
+            )
+            # Abaixo do corte o pontuador devolve 0
+            linhas, colunas = np.nonzero(matriz >= self.match_threshold)
+            if progresso is not None:
+                progresso.avancar(len(indices_bloco))
+            yield indices_bloco[linhas], colunas.astype(np.int64), matriz[linhas, colunas]
+
     def adicionar_ao_cesta_df(self, df_a_adicionar):
         """
         Adiciona itens à cesta de compras, tratando duplicatas.
@@ -0,0 +1,162 @@
+"""
+Correlação em paralelo com um pool de processos mantido aquecido durante a sessão.
+
+O corpus de referências é enviado aos processos uma única vez, pelo
+`initializer` do pool. Enquanto o corpus não muda (ex.: o usuário só alterou a
+taxa de similaridade), o mesmo pool é reaproveitado sem novo custo de spawn.
+Com FiltrarPorGrandeza cada tarefa leva só a grandeza: o processo filho monta
+as partições do corpus completo uma vez e correlaciona na partição pedida,
+então todas as partições usam o mesmo pool.
+"""
+
+import atexit
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from ConversorMedidas import GrandezaFisica
+from corpus_referencia import CorpusReferencia
+from motores_similaridade import Correlacoes, obter_motor
+from progresso import OperacaoCancelada
+
+# Fatias por processo: mais fatias equilibram melhor itens de custos diferentes
+FATIAS_POR_PROCESSO = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_assinatura: Optional[str] = None
+_pool_processos: int = 0
+
+# Corpus carregado no processo filho (definido pelo initializer)
+_corpus_worker: Optional[CorpusReferencia] = None
+
+
+def assinatura_corpus(corpus: CorpusReferencia) -> str:
+    """Hash do conteúdo normalizado do corpus, usado para saber se o pool pode ser reaproveitado"""
+    return corpus.assinatura()
+
+
+def _inicializar_worker(corpus: CorpusReferencia):
+    global _corpus_worker
+    _corpus_worker = corpus
+
+
+def _corpus_da_particao(corpus: CorpusReferencia, particao: Optional[GrandezaFisica]) -> CorpusReferencia:
+    """O corpus inteiro ou a partição de uma grandeza (montada uma vez por corpus)"""
+    return corpus if particao is None else corpus.particionar_por_grandeza()[particao][0]
+
+
+def _correlacionar_fatia(
+    nome_motor: str,
+    descricoes_orcamento: List[str],
+    taxa: float,
+    limite: int,
+    opcoes_motor: Dict,
+    particao: Optional[GrandezaFisica] = None
+) -> Correlacoes:
+    motor = obter_motor(nome_motor)
+    return motor(descricoes_orcamento, _corpus_da_particao(_corpus_worker, particao), taxa, limite=limite, **opcoes_motor)
+
+
+def obter_pool(corpus: CorpusReferencia, processos: int) -> ProcessPoolExecutor:
+    """Retorna o pool aquecido para este corpus, recriando-o só se o corpus ou o nº de processos mudou"""
+    global _pool, _pool_assinatura, _pool_processos
+
+    assinatura = assinatura_corpus(corpus)
+    if _pool is not None and _pool_assinatura == assinatura and _pool_processos == processos:
+        return _pool
+
+    encerrar_pool()
+    _pool = ProcessPoolExecutor(
+        max_workers=processos,
+        initializer=_inicializar_worker,
+        initargs=(corpus,)
+    )
+    _pool_assinatura = assinatura
+    _pool_processos = processos
+    return _pool
+
+
+def encerrar_pool():
+    """Encerra o pool de processos da sessão (chamado automaticamente na saída)"""
+    global _pool, _pool_assinatura, _pool_processos
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _pool_assinatura = None
+    _pool_processos = 0
+
+
+atexit.register(encerrar_pool)
+
+
+def correlacionar_em_paralelo(
+    nome_motor: str,
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    processos: int = 0,
+    ao_progredir: Optional[Callable[..., None]] = None,
+    limite: int = 0,
+    opcoes_motor: Optional[Dict] = None,
+    particao: Optional[GrandezaFisica] = None
+) -> Correlacoes:
+    """
+    Divide os itens do orçamento em fatias e as correlaciona no pool de processos.
+    Os resultados das fatias são concatenados na ordem original dos itens.
+
+    Args:
+        processos: Nº de processos (0 = todos os núcleos)
+        ao_progredir: Chamado com a quantidade de itens de cada fatia concluída e, com 0,
+            periodicamente enquanto aguarda (mantém a janela responsiva); se levantar
+            exceção, as fatias pendentes são canceladas (OperacaoCancelada segue com as
+            correlações das primeiras fatias já concluídas em `parciais`)
+        limite: Máximo de referências por item (0 = sem limite)
+        opcoes_motor: Argumentos extras do motor (ex.: bandas e linhas do "minhash")
+        particao: Grandeza da partição de `corpus` a usar (None = corpus inteiro);
+            o pool continua sendo o do corpus inteiro
+    """
+    opcoes_motor = opcoes_motor or {}
+    if processos <= 0:
+        processos = os.cpu_count() or 1
+
+    motor = obter_motor(nome_motor)
+    if processos == 1 or len(descricoes_orcamento) < 2 * processos:
+        # Pouco trabalho: o custo de comunicação não compensa
+        return motor(
+            descricoes_orcamento, _corpus_da_particao(corpus, particao), taxa,
+            ao_progredir=ao_progredir, limite=limite, **opcoes_motor
+        )
+
+    pool = obter_pool(corpus, processos)
+    total_fatias = processos * FATIAS_POR_PROCESSO
+    tamanho_fatia = max(1, -(-len(descricoes_orcamento) // total_fatias))
+
+    fatias = [descricoes_orcamento[inicio:inicio + tamanho_fatia] for inicio in range(0, len(descricoes_orcamento), tamanho_fatia)]
+    futuros = [
+        pool.submit(_correlacionar_fatia, nome_motor, fatia, taxa, limite, opcoes_motor, particao)
+        for fatia in fatias
+    ]
+    tamanhos = {futuro: len(fatia) for futuro, fatia in zip(futuros, fatias)}
+
+    pendentes = set(futuros)
+    try:
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, timeout=0.1, return_when=FIRST_COMPLETED)
+            if ao_progredir:
+                ao_progredir(sum(tamanhos[futuro] for futuro in concluidos))
+    except BaseException as e:
+        # Cancelamento (ex.: OperacaoCancelada levantada por ao_progredir): descarta as fatias que não começaram
+        for futuro in pendentes:
+            futuro.cancel()
+        if isinstance(e, OperacaoCancelada):
+            e.parciais = []
+            for futuro in futuros:
+                if futuro in pendentes or futuro.exception() is not None:
+                    break
+                e.parciais.extend(futuro.result())
+        raise
+
+    correlacoes: Correlacoes = []
+    for futuro in futuros:
+        correlacoes.extend(futuro.result())
+    return correlacoes
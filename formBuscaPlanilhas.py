@@ -1,12 +1,12 @@
 
 import tkinter as tk
 from tkinter import ttk, filedialog
-import pandas as pd
 from dataclasses import dataclass
 from parametrosPlanilha import ParametrosPlanilhas
 from formParametrosPesquisa import FormParametrosPesquisa
 from formSelecaoAba import FormSelecaoAba
 from ParametrosProcessamento import ParametrosProcessamento
+from leitura_planilhas import listar_abas
 
 class FormBuscaPlanilhas:
     def __init__(self):
@@ -166,7 +166,7 @@ class FormBuscaPlanilhas:
     def buscar_planilhas(self, entrada_destino, titulo_janela):
         caminho_arquivo = filedialog.askopenfilename(
             title=titulo_janela,
-            filetypes=[("Planilhas Excel", "*.xlsx *.xls")]
+            filetypes=[("Planilhas Excel", "*.xlsx *.xls"), ("Catálogos CSV", "*.csv")]
         )
         if caminho_arquivo:
             entrada_destino.delete(0, tk.END)
@@ -200,7 +200,7 @@ class FormBuscaPlanilhas:
             
         try:
             # Lê as abas da planilha
-            excel = pd.ExcelFile(caminho_planilha)
+            abas = listar_abas(caminho_planilha)
         except FileNotFoundError:
             tk.messagebox.showerror("Erro", "Arquivo não encontrado. Selecione um arquivo válido.")
             return
@@ -211,7 +211,6 @@ class FormBuscaPlanilhas:
             tk.messagebox.showerror("Erro", f"Erro inesperado ao ler a planilha: {e}")
             return
 
-        abas = excel.sheet_names
         if not abas:
             tk.messagebox.showwarning("Aviso", "A planilha não contém nenhuma aba.")
             return
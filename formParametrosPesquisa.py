@@ -7,6 +7,7 @@ from OperacaoCorrelacao import OperacaoCorrelacao
 from parametros_planilhas_pesquisa import ParametrosPlanilhasPesquisa
 from ParametrosProcessamento import ParametrosProcessamento
 from processamento import TelaProcessamento, ProcessamentoBase
+from motores_similaridade import MOTORES
 
 class FormParametrosPesquisa:
     def __init__(self, parametros_referencia_teste: ParametrosPlanilhas, parametros_orcamento_teste: ParametrosPlanilhas, parent=None):
@@ -27,7 +28,7 @@ class FormParametrosPesquisa:
                 pass
 
         self.janela.title("Busca Automática de Composições")
-        self.janela.geometry("700x450")
+        self.janela.geometry("700x490")
 
         for i in range(6):
             self.janela.grid_columnconfigure(i, weight=1)
@@ -116,8 +117,18 @@ class FormParametrosPesquisa:
         )
         self.entrada_taxa_similaridade.grid(row=11, column=2, columnspan=4, sticky="we", padx=10, pady=5)
 
+        motor_similaridade = tk.Label(self.janela, text="Motor de Similaridade:")
+        motor_similaridade.grid(row=12, column=0, columnspan=2, padx=10, pady=5, sticky="n")
+        self.combo_motor_similaridade = ttk.Combobox(
+            self.janela,
+            state="readonly",
+            values=list(MOTORES)
+        )
+        self.combo_motor_similaridade.set("sequencematcher")
+        self.combo_motor_similaridade.grid(row=12, column=2, columnspan=4, sticky="we", padx=10, pady=5)
+
         frame_botoes = tk.Frame(self.janela)
-        frame_botoes.grid(row=12, column=4, columnspan=2, padx=10, pady=5, sticky="nsew")
+        frame_botoes.grid(row=13, column=4, columnspan=2, padx=10, pady=5, sticky="nsew")
         frame_botoes.grid_columnconfigure(0, weight=1)
         frame_botoes.grid_columnconfigure(1, weight=1)
 
@@ -131,13 +142,15 @@ class FormParametrosPesquisa:
         self.comeco_pesquisa_preencher.delete(0, tk.END)
         self.termino_pesquisa_preencher.delete(0, tk.END)
         self.entrada_taxa_similaridade.delete(0, tk.END)
+        self.combo_motor_similaridade.set("sequencematcher")
 
     def avancar(self):
         # Dados da tela atual
         operacaoAtual = OperacaoCorrelacao(
             ComecoPesquisa=int(self.comeco_pesquisa_preencher.get()),
             TerminoPesquisa=int(self.termino_pesquisa_preencher.get()),
-            TaxaSimilaridade=float(self.entrada_taxa_similaridade.get())
+            TaxaSimilaridade=float(self.entrada_taxa_similaridade.get()),
+            MotorSimilaridade=self.combo_motor_similaridade.get()
         )
 
         # Cria um objeto ParametrosProcessamento tipado
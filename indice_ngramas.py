@@ -0,0 +1,148 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Tamanhos de n-grama, em ordem de preferência (ver IndiceNGramas.tamanho_para)
+TAMANHOS_NGRAMA = (3, 2)
+
+
+class IndiceNGramas:
+    """
+    Índice invertido de n-gramas de caracteres sobre as descrições de referência.
+
+    Usado para gerar candidatos antes do SequenceMatcher: só são devolvidas as
+    referências que ainda podem ultrapassar a taxa de similaridade.
+
+    O filtro por contagem é exato (não perde correlações). Se M é o total de
+    caracteres dos blocos casados pelo SequenceMatcher e T = len(a) + len(b),
+    cada bloco de tamanho L compartilha pelo menos L - (q - 1) n-gramas e
+    existem no máximo T - 2M + 1 blocos. Logo:
+
+        compartilhados >= (2q - 1) * M - (q - 1) * (T + 1)
+
+    e, como ratio = 2M / T > taxa, basta exigir
+
+        compartilhados > ((2q - 1) * taxa / 2 - (q - 1)) * T - (q - 1)
+
+    O limite só descarta pares quando o coeficiente é positivo, isto é, quando
+    taxa > 2(q - 1) / (2q - 1): acima de 0.8 para trigramas e acima de 2/3 para
+    bigramas. `tamanho_para` escolhe q pela taxa; abaixo de 2/3 nenhum dos dois
+    descarta nada e o índice não deve ser construído.
+    """
+
+    def __init__(self, descricoes: List[str], tamanho: int = 3):
+        """
+        Args:
+            descricoes: Descrições já normalizadas (mesma normalização da consulta)
+            tamanho: Tamanho do n-grama (3 = trigramas)
+        """
+        self.tamanho = tamanho
+        self.total = len(descricoes)
+        self.comprimentos = [len(descricao) for descricao in descricoes]
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        for posicao, descricao in enumerate(descricoes):
+            for ngrama, quantidade in Counter(self._ngramas(descricao)).items():
+                self.postings[ngrama].append((posicao, quantidade))
+
+        # Posições ordenadas por comprimento: referências curtas podem passar sem compartilhar n-gramas
+        self._ordem_por_comprimento = sorted(range(self.total), key=self.comprimentos.__getitem__)
+        self._comprimentos_ordenados = [self.comprimentos[p] for p in self._ordem_por_comprimento]
+
+    def para_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Índice em arrays numpy (para gravar em disco sem pickle): n-gramas em
+        UTF-8 com deslocamentos e postings em formato CSR (início de cada n-grama
+        em `posicoes`/`quantidades`).
+        """
+        ngramas = list(self.postings)
+        codificados = [ngrama.encode("utf-8", "surrogatepass") for ngrama in ngramas]
+        inicio = np.zeros(len(ngramas) + 1, dtype=np.int64)
+        inicio[1:] = np.cumsum([len(self.postings[ngrama]) for ngrama in ngramas])
+        fim_ngramas = np.zeros(len(ngramas) + 1, dtype=np.int64)
+        fim_ngramas[1:] = np.cumsum([len(codificado) for codificado in codificados])
+        pares = [par for ngrama in ngramas for par in self.postings[ngrama]]
+        return {
+            "tamanho": np.array([self.tamanho], dtype=np.int64),
+            "ngramas": np.frombuffer(b"".join(codificados), dtype=np.uint8),
+            "fim_ngramas": fim_ngramas,
+            "inicio": inicio,
+            "posicoes": np.array([posicao for posicao, _ in pares], dtype=np.int64),
+            "quantidades": np.array([quantidade for _, quantidade in pares], dtype=np.int64),
+            "comprimentos": np.array(self.comprimentos, dtype=np.int64),
+        }
+
+    @classmethod
+    def de_arrays(cls, arrays: Dict[str, np.ndarray]) -> "IndiceNGramas":
+        """Reconstrói o índice gravado por `para_arrays` (sem recalcular os n-gramas)"""
+        indice = cls.__new__(cls)
+        indice.tamanho = int(arrays["tamanho"][0])
+        indice.comprimentos = arrays["comprimentos"].tolist()
+        indice.total = len(indice.comprimentos)
+
+        texto = arrays["ngramas"].tobytes()
+        fim_ngramas = arrays["fim_ngramas"].tolist()
+        inicio = arrays["inicio"].tolist()
+        posicoes = arrays["posicoes"].tolist()
+        quantidades = arrays["quantidades"].tolist()
+        indice.postings = defaultdict(list)
+        for i in range(len(inicio) - 1):
+            ngrama = texto[fim_ngramas[i]:fim_ngramas[i + 1]].decode("utf-8", "surrogatepass")
+            indice.postings[ngrama] = list(zip(posicoes[inicio[i]:inicio[i + 1]], quantidades[inicio[i]:inicio[i + 1]]))
+
+        indice._ordem_por_comprimento = sorted(range(indice.total), key=indice.comprimentos.__getitem__)
+        indice._comprimentos_ordenados = [indice.comprimentos[p] for p in indice._ordem_por_comprimento]
+        return indice
+
+    @staticmethod
+    def tamanho_para(taxa: float) -> Optional[int]:
+        """Tamanho de n-grama cujo limite descarta pares nessa taxa (3 acima de 0.8, 2 acima de 2/3); None se nenhum"""
+        for tamanho in TAMANHOS_NGRAMA:
+            if (2 * tamanho - 1) * taxa / 2 - (tamanho - 1) > 0:
+                return tamanho
+        return None
+
+    def _ngramas(self, texto: str) -> List[str]:
+        q = self.tamanho
+        return [texto[i:i + q] for i in range(len(texto) - q + 1)]
+
+    def coeficiente(self, taxa: float) -> float:
+        """Coeficiente do limite de contagem; <= 0 significa que o filtro não descarta nada"""
+        q = self.tamanho
+        return (2 * q - 1) * taxa / 2 - (q - 1)
+
+    def candidatos(self, descricao: str, taxa: float) -> List[int]:
+        """
+        Retorna as posições (em ordem crescente) das referências que podem ter
+        similaridade maior que `taxa` com `descricao`.
+        """
+        q = self.tamanho
+        coeficiente = self.coeficiente(taxa)
+        if coeficiente <= 0:
+            # Limite vazio: nenhuma referência pode ser descartada pela contagem
+            return list(range(self.total))
+
+        comprimento_consulta = len(descricao)
+        compartilhados: Dict[int, int] = defaultdict(int)
+        for ngrama, quantidade in Counter(self._ngramas(descricao)).items():
+            for posicao, quantidade_ref in self.postings.get(ngrama, ()):
+                compartilhados[posicao] += min(quantidade, quantidade_ref)
+
+        def minimo_exigido(posicao: int) -> float:
+            total_caracteres = comprimento_consulta + self.comprimentos[posicao]
+            # Margem pequena para não descartar nada por arredondamento de ponto flutuante
+            return coeficiente * total_caracteres - (q - 1) - 1e-9
+
+        resultado = {
+            posicao for posicao, quantidade in compartilhados.items()
+            if quantidade > minimo_exigido(posicao)
+        }
+
+        # Referências cujo mínimo exigido não é positivo passam mesmo sem n-gramas em comum
+        limite_comprimento = (q - 1) / coeficiente - comprimento_consulta
+        corte = bisect_right(self._comprimentos_ordenados, limite_comprimento + 1e-6)
+        resultado.update(self._ordem_por_comprimento[:corte])
+
+        return sorted(resultado)
@@ -0,0 +1,481 @@
+"""
+Leitura projetada das planilhas: só as colunas mapeadas (letras do Excel em
+ParametrosPlanilhas) e só o intervalo de linhas pesquisado.
+
+O índice do DataFrame devolvido é o número da linha no Excel, para o
+restante do fluxo continuar usando a linha original.
+
+Para catálogos grandes, `iterar_linhas` lê em streaming (openpyxl
+read_only), linha a linha, sem montar DataFrame nenhum.
+
+Toda leitura de planilha do aplicativo passa por aqui, com o backend escolhido
+pela extensão e pelo que estiver instalado: calamine (`pd.read_excel(engine=
+"calamine")`, exige `python-calamine`), openpyxl ou CSV (catálogos exportados).
+`benchmark_leitura.py` mede o tempo de cada backend nas planilhas de exemplo.
+
+Cada aba Excel é lida no máximo uma vez por sessão enquanto o arquivo não
+mudar: as células brutas (antes da conversão de tipos do pandas) ficam em
+memória (`sessao`) e, com `pyarrow` instalado, em disco ao lado do arquivo
+(`cache_planilhas`), e cada recorte (colunas e intervalo de linhas) sai delas
+pelo mesmo TextParser do `pd.read_excel`, com os mesmos valores e tipos. A
+primeira leitura para no fim do intervalo pedido (como o `nrows`); só um
+intervalo além dele relê a aba, já inteira.
+"""
+
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+import cache_planilhas
+
+# Linha 1 é o cabeçalho; os dados começam na linha 2 do Excel
+PRIMEIRA_LINHA_DADOS = 2
+
+# Extensões que cada backend lê
+BACKENDS = {
+    "calamine": {".xlsx", ".xlsm", ".xlsb", ".xls", ".ods"},
+    "openpyxl": {".xlsx", ".xlsm"},
+    "csv": {".csv", ".txt"},
+}
+
+# Do mais rápido para o mais lento, para a escolha automática
+ORDEM_PREFERENCIA = ("csv", "calamine", "openpyxl")
+
+# Backend preferido quando suporta a extensão (None = automático)
+BACKEND_PADRAO: Optional[str] = None
+
+# Memória máxima das planilhas mantidas na sessão (bytes)
+LIMITE_MEMORIA_SESSAO = 512 * 1024 * 1024
+
+# Codificações tentadas nos CSV (UTF-8 e, como exporta o Excel em português, Latin-1)
+CODIFICACOES_CSV = ("utf-8-sig", "latin-1")
+
+# Valores de erro do Excel, lidos como vazios (NaN), como no pandas
+ERROS_EXCEL = {"#N/A", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#NULL!"}
+
+# Backends cujas abas brutas ficam nos caches (ver `_ler_aba_bruta`)
+BACKENDS_COM_CACHE = ("calamine", "openpyxl")
+
+# Coluna da aba bruta com o fim de cada linha (colunas até a última preenchida)
+_COLUNA_FIM = "fim"
+
+
+def indice_coluna(coluna: str) -> int:
+    """Letra(s) da coluna do Excel -> índice 0-based ("A" -> 0, "AA" -> 26)"""
+    indice = 0
+    for char in coluna.upper():
+        indice = indice * 26 + (ord(char) - ord('A') + 1)
+    return indice - 1
+
+
+def backend_disponivel(backend: str) -> bool:
+    """True se as dependências do backend estão instaladas"""
+    if backend == "calamine":
+        return find_spec("python_calamine") is not None
+    if backend == "openpyxl":
+        return find_spec("openpyxl") is not None
+    return backend == "csv"
+
+
+def escolher_backend(caminho_planilha: str, backend: Optional[str] = None) -> Optional[str]:
+    """
+    Backend para o arquivo: o informado (ValueError se não estiver instalado),
+    senão BACKEND_PADRAO se ler a extensão, senão o mais rápido disponível.
+    None deixa o pandas escolher o engine (ex.: xlrd para .xls sem calamine).
+    """
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de leitura desconhecido: {backend}. Opções: {', '.join(BACKENDS)}")
+        if not backend_disponivel(backend):
+            raise ValueError(f"Backend de leitura indisponível: {backend}")
+        return backend
+
+    extensao = Path(caminho_planilha).suffix.lower()
+    candidatos = ORDEM_PREFERENCIA if BACKEND_PADRAO is None else (BACKEND_PADRAO,) + ORDEM_PREFERENCIA
+    for candidato in candidatos:
+        if extensao in BACKENDS[candidato] and backend_disponivel(candidato):
+            return candidato
+    return None
+
+
+def _opcoes_csv(caminho_planilha: str, codificacao: str) -> dict:
+    """Separador ';' com vírgula decimal (Excel em português) ou ',' com ponto"""
+    with open(caminho_planilha, encoding=codificacao) as arquivo:
+        primeira_linha = arquivo.readline()
+    if primeira_linha.count(";") > primeira_linha.count(","):
+        return {"sep": ";", "decimal": ",", "thousands": "."}
+    return {"sep": ","}
+
+
+def _ler_csv(caminho_planilha: str, **opcoes) -> pd.DataFrame:
+    for codificacao in CODIFICACOES_CSV:
+        try:
+            return pd.read_csv(
+                caminho_planilha,
+                encoding=codificacao,
+                **_opcoes_csv(caminho_planilha, codificacao),
+                **opcoes
+            )
+        except UnicodeDecodeError:
+            if codificacao == CODIFICACOES_CSV[-1]:
+                raise
+
+
+class CachePlanilhasSessao:
+    """
+    Livros abertos (pd.ExcelFile), abas lidas e o que é montado a partir delas
+    (ex.: o corpus de referência), mantidos durante a sessão: listar as abas,
+    processar, reabrir a tela de processamento ou o Correlacionador
+    reaproveitam a mesma leitura. Cada entrada tem uma chave por arquivo,
+    guarda o mtime e o tamanho do arquivo e é descartada quando ele muda.
+    Passando de `limite_bytes`, saem as entradas usadas há mais tempo.
+    """
+
+    def __init__(self, limite_bytes: int = LIMITE_MEMORIA_SESSAO):
+        self.limite_bytes = limite_bytes
+        self.habilitado = True
+        self._entradas: "OrderedDict[tuple, Tuple[tuple, object, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def livro(self, caminho_planilha: str, backend: Optional[str]) -> pd.ExcelFile:
+        """Livro aberto (o tamanho do arquivo conta como memória ocupada)"""
+        return self.obter(
+            caminho_planilha,
+            ("livro", backend),
+            lambda: pd.ExcelFile(caminho_planilha, engine=backend),
+            lambda _: os.path.getsize(caminho_planilha)
+        )
+
+    def obter(self, caminho_planilha: str, chave: tuple, carregar: Callable, tamanho: Callable[[object], int]):
+        """O valor `chave` do arquivo, montado por `carregar()` só na primeira vez (ou depois que o arquivo mudar)"""
+        if not self.habilitado:
+            return carregar()
+        valor = self.consultar(caminho_planilha, chave)
+        if valor is None:
+            estado = os.stat(caminho_planilha)
+            valor = carregar()
+            self.guardar(caminho_planilha, chave, valor, tamanho(valor), estado)
+        return valor
+
+    def consultar(self, caminho_planilha: str, chave: tuple):
+        """O valor `chave` do arquivo, se já foi guardado e o arquivo não mudou; None senão (sem ler nada)"""
+        if not self.habilitado:
+            return None
+        chave = (str(Path(caminho_planilha).resolve()), chave)
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        estado = os.stat(caminho_planilha)
+        if entrada[0] != (estado.st_mtime_ns, estado.st_size):
+            self._remover(chave)
+            return None
+        self._entradas.move_to_end(chave)
+        return entrada[1]
+
+    def guardar(self, caminho_planilha: str, chave: tuple, valor, tamanho: int, estado: os.stat_result):
+        """Guarda (ou substitui) o valor `chave` do arquivo; `estado` é o os.stat de antes da leitura"""
+        if not self.habilitado:
+            return
+        chave = (str(Path(caminho_planilha).resolve()), chave)
+        if chave in self._entradas:
+            self._remover(chave)
+        self._entradas[chave] = ((estado.st_mtime_ns, estado.st_size), valor, tamanho)
+        self._bytes += tamanho
+        # A entrada mais recente fica, mesmo sozinha acima do limite
+        while self._bytes > self.limite_bytes and len(self._entradas) > 1:
+            self._remover(next(iter(self._entradas)))
+
+    def limpar(self):
+        for chave in list(self._entradas):
+            self._remover(chave)
+
+    def _remover(self, chave: tuple):
+        _, valor, tamanho = self._entradas.pop(chave)
+        self._bytes -= tamanho
+        if isinstance(valor, pd.ExcelFile):
+            valor.close()
+
+
+# Planilhas da sessão, compartilhadas por todas as janelas
+sessao = CachePlanilhasSessao()
+
+
+@dataclass
+class AbaBruta:
+    """
+    Células de uma aba como o leitor do pandas as entrega ao TextParser (sem
+    cabeçalho, vazias como ""), mais a coluna `_COLUNA_FIM`. `linhas_lidas` é
+    quantas linhas do início foram lidas (None = a aba inteira).
+    """
+    dados: pd.DataFrame
+    linhas_lidas: Optional[int]
+
+    def cobre(self, linhas_necessarias: Optional[int]) -> bool:
+        return self.linhas_lidas is None or (
+            linhas_necessarias is not None and linhas_necessarias <= self.linhas_lidas
+        )
+
+
+def ler_tabela(
+    caminho_planilha: str,
+    aba: Union[str, int] = 0,
+    colunas: Optional[Set[int]] = None,
+    pular_linhas: int = 0,
+    linhas: Optional[int] = None,
+    backend: Optional[str] = None,
+    usar_cache: bool = True
+) -> pd.DataFrame:
+    """
+    Leitura bruta (sem cabeçalho; rótulos = índices 0-based das colunas) pelo
+    backend escolhido. `colunas` restringe as colunas lidas; `pular_linhas` e
+    `linhas` delimitam as linhas. Em CSV a aba é ignorada.
+
+    Com `usar_cache` (e backend calamine ou openpyxl), o resultado é o mesmo
+    do `pd.read_excel(header=None, usecols, skiprows, nrows)`, mas recortado
+    da aba bruta da sessão ou do cache em disco (ver `_aba_bruta`).
+    """
+    backend = escolher_backend(caminho_planilha, backend)
+    if backend == "csv":
+        # O read_csv não aplica `usecols` chamável sem cabeçalho: filtra depois
+        dados = _ler_csv(caminho_planilha, header=None, skiprows=pular_linhas, nrows=linhas)
+        return dados if colunas is None else dados[[coluna for coluna in dados.columns if coluna in colunas]]
+    def ler():
+        return pd.read_excel(
+            caminho_planilha,
+            sheet_name=aba,
+            header=None,
+            usecols=None if colunas is None else (lambda coluna: coluna in colunas),
+            skiprows=pular_linhas,
+            nrows=linhas,
+            engine=backend
+        )
+
+    if not usar_cache or backend not in BACKENDS_COM_CACHE or not (sessao.habilitado or cache_planilhas.disponivel()):
+        return ler()
+    aba_bruta = _aba_bruta(caminho_planilha, aba, backend, _linhas_necessarias(pular_linhas, linhas))
+    return _recortar(aba_bruta, colunas, pular_linhas, linhas)
+
+
+def _linhas_necessarias(pular_linhas: int, linhas: Optional[int]) -> Optional[int]:
+    """Linhas do início que o pd.read_excel lê para o intervalo (uma a mais que skiprows + nrows)"""
+    return None if linhas is None else pular_linhas + linhas + 1
+
+
+def _aba_bruta(
+    caminho_planilha: str,
+    aba: Union[str, int],
+    backend: str,
+    linhas_necessarias: Optional[int]
+) -> AbaBruta:
+    """
+    A aba bruta da sessão ou do cache em disco, se tiver as linhas necessárias;
+    senão lida da planilha (pelo livro aberto da sessão) e guardada nos dois.
+    A primeira leitura para em `linhas_necessarias`; as seguintes leem a aba
+    inteira, para o próximo intervalo não reler a planilha de novo.
+    """
+    aba_bruta = _aba_bruta_em_cache(caminho_planilha, aba, linhas_necessarias, completa=False)
+    if aba_bruta is not None and aba_bruta.cobre(linhas_necessarias):
+        return aba_bruta
+
+    estado = os.stat(caminho_planilha)
+    linhas_lidas = linhas_necessarias if aba_bruta is None else None
+    aba_bruta = AbaBruta(_ler_aba_bruta(caminho_planilha, aba, backend, linhas_lidas), linhas_lidas)
+    cache_planilhas.gravar(caminho_planilha, aba, aba_bruta.dados, {"linhas_lidas": linhas_lidas}, estado)
+    _guardar_aba_bruta(caminho_planilha, aba, aba_bruta, estado)
+    return aba_bruta
+
+
+def _aba_bruta_em_cache(
+    caminho_planilha: str,
+    aba: Union[str, int],
+    linhas_necessarias: Optional[int],
+    completa: bool = True
+) -> Optional[AbaBruta]:
+    """
+    A aba bruta da sessão ou, se a da sessão não tiver as linhas necessárias,
+    do cache em disco (sem ler a planilha). Com `completa=False`, devolve a
+    que houver mesmo sem as linhas necessárias; None se não houver nenhuma.
+    """
+    aba_bruta = sessao.consultar(caminho_planilha, ("aba", aba))
+    if aba_bruta is None or not aba_bruta.cobre(linhas_necessarias):
+        gravada = cache_planilhas.consultar(caminho_planilha, aba)
+        if gravada is not None:
+            dados, info = gravada
+            aba_bruta = AbaBruta(dados, info["linhas_lidas"])
+            _guardar_aba_bruta(caminho_planilha, aba, aba_bruta, os.stat(caminho_planilha))
+    if aba_bruta is None or (completa and not aba_bruta.cobre(linhas_necessarias)):
+        return None
+    return aba_bruta
+
+
+def _guardar_aba_bruta(caminho_planilha: str, aba: Union[str, int], aba_bruta: AbaBruta, estado: os.stat_result):
+    tamanho = int(aba_bruta.dados.memory_usage(deep=True).sum())
+    sessao.guardar(caminho_planilha, ("aba", aba), aba_bruta, tamanho, estado)
+
+
+def _ler_aba_bruta(caminho_planilha: str, aba: Union[str, int], backend: str, linhas: Optional[int]) -> pd.DataFrame:
+    """
+    As `linhas` primeiras linhas da aba (None = todas) sem conversão de tipos
+    (`dtype=object`, sem NaN), mais `_COLUNA_FIM`: o openpyxl descarta as
+    células vazias do fim de cada linha e as linhas vazias do fim do que leu;
+    o calamine devolve todas as linhas com a largura da aba.
+    """
+    opcoes = dict(sheet_name=aba, header=None, dtype=object, na_filter=False, nrows=linhas)
+    if sessao.habilitado:
+        dados = sessao.livro(caminho_planilha, backend).parse(**opcoes)
+    else:
+        dados = pd.read_excel(caminho_planilha, engine=backend, **opcoes)
+
+    if backend == "openpyxl":
+        preenchidas = dados.ne("").to_numpy()
+        fim = (preenchidas * np.arange(1, dados.shape[1] + 1)).max(axis=1, initial=0)
+    else:
+        fim = np.full(len(dados), dados.shape[1])
+    return dados.assign(**{_COLUNA_FIM: fim.astype(np.int64)})
+
+
+def _recortar(aba_bruta: AbaBruta, colunas: Optional[Set[int]], pular_linhas: int, linhas: Optional[int]) -> pd.DataFrame:
+    """
+    O que o pd.read_excel devolveria para o recorte: as linhas que ele leria
+    (sem as vazias do fim), com a largura da mais longa delas, pelo mesmo
+    TextParser (só nas colunas pedidas).
+    """
+    dados = aba_bruta.dados
+    fim = dados[_COLUNA_FIM].to_numpy()[:_linhas_necessarias(pular_linhas, linhas)]
+    com_dados = np.flatnonzero(fim)
+    if not len(com_dados):
+        return pd.DataFrame()
+    ultima_linha = int(com_dados[-1]) + 1
+    largura = int(fim[:ultima_linha].max())
+    rotulos = [coluna for coluna in range(largura) if colunas is None or coluna in colunas]
+    if not rotulos:
+        return pd.DataFrame()
+
+    valores = dados[rotulos].iloc[pular_linhas:ultima_linha].to_numpy().tolist()
+    try:
+        resultado = TextParser(valores, header=None, nrows=linhas, skip_blank_lines=False).read(nrows=linhas)
+    except EmptyDataError:
+        return pd.DataFrame()
+    resultado.columns = rotulos
+    return resultado
+
+
+def listar_abas(caminho_planilha: str, backend: Optional[str] = None) -> List[str]:
+    """Nomes das abas (um CSV tem uma única "aba", com o nome do arquivo)"""
+    backend = escolher_backend(caminho_planilha, backend)
+    if backend == "csv":
+        return [Path(caminho_planilha).stem]
+    return list(sessao.livro(caminho_planilha, backend).sheet_names)
+
+
+def ler_colunas(
+    caminho_planilha: str,
+    colunas: Dict[str, str],
+    aba: Union[str, int] = 0,
+    primeira_linha: int = PRIMEIRA_LINHA_DADOS,
+    ultima_linha: Optional[int] = None,
+    backend: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Lê as colunas `{nome: letra}` das linhas `primeira_linha..ultima_linha`
+    (numeração do Excel, inclusive; None = até o fim). O DataFrame tem uma
+    coluna por nome, na ordem de `colunas`, e o índice é a linha do Excel.
+    Uma letra pode aparecer em mais de um nome; colunas que não existem na
+    planilha vêm vazias (NaN).
+    """
+    indices, primeira_linha, nrows = _intervalo(colunas, primeira_linha, ultima_linha)
+    dados = ler_tabela(caminho_planilha, aba, set(indices.values()), primeira_linha - 1, nrows, backend)
+    return _projetar(dados, indices, primeira_linha)
+
+
+def _intervalo(
+    colunas: Dict[str, str],
+    primeira_linha: int,
+    ultima_linha: Optional[int]
+) -> Tuple[Dict[str, int], int, Optional[int]]:
+    """(índice de cada coluna, primeira linha de dados, quantidade de linhas ou None)"""
+    indices = {nome: indice_coluna(letra) for nome, letra in colunas.items()}
+    primeira_linha = max(primeira_linha, PRIMEIRA_LINHA_DADOS)
+    nrows = None if ultima_linha is None else max(ultima_linha - primeira_linha + 1, 0)
+    return indices, primeira_linha, nrows
+
+
+def _projetar(dados: pd.DataFrame, indices: Dict[str, int], primeira_linha: int) -> pd.DataFrame:
+    projetado = pd.DataFrame(
+        {nome: dados[indice] if indice in dados.columns else pd.Series(float("nan"), index=dados.index)
+         for nome, indice in indices.items()}
+    )
+    projetado.index = dados.index + primeira_linha
+    return projetado
+
+
+def _valor_celula(valor):
+    """Célula vazia ou com erro do Excel vira NaN (mesma convenção do pd.read_excel)"""
+    if valor is None or valor == "" or (isinstance(valor, str) and valor in ERROS_EXCEL):
+        return float("nan")
+    return valor
+
+
+def iterar_linhas(
+    caminho_planilha: str,
+    colunas: Dict[str, str],
+    aba: Union[str, int] = 0,
+    primeira_linha: int = PRIMEIRA_LINHA_DADOS,
+    ultima_linha: Optional[int] = None,
+    backend: Optional[str] = None
+) -> Iterator[Tuple[int, tuple]]:
+    """
+    Gera (linha do Excel, valores das colunas na ordem de `colunas`). Com o
+    backend openpyxl, sem montar DataFrame: `load_workbook(read_only=True)` +
+    `iter_rows(values_only=True)`, restrito às colunas entre a primeira e a
+    última mapeada; se a aba bruta já está na sessão ou no cache em disco
+    (ex.: lida por `ler_colunas`), o recorte sai dela. Nos demais backends
+    (calamine, CSV), linha a linha do DataFrame projetado de `ler_colunas`.
+    """
+    backend = escolher_backend(caminho_planilha, backend)
+    if backend != "openpyxl":
+        dados = ler_colunas(caminho_planilha, colunas, aba, primeira_linha, ultima_linha, backend)
+    else:
+        indices_colunas, primeira_linha, nrows = _intervalo(colunas, primeira_linha, ultima_linha)
+        linhas_necessarias = _linhas_necessarias(primeira_linha - 1, nrows)
+        aba_bruta = _aba_bruta_em_cache(caminho_planilha, aba, linhas_necessarias)
+        dados = None
+        if aba_bruta is not None:
+            recorte = _recortar(aba_bruta, set(indices_colunas.values()), primeira_linha - 1, nrows)
+            dados = _projetar(recorte, indices_colunas, primeira_linha)
+    if dados is not None:
+        for numero_linha, *valores in dados.itertuples(name=None):
+            yield int(numero_linha), tuple(valores)
+        return
+
+    from openpyxl import load_workbook
+
+    indices = list(indices_colunas.values())
+    primeira_coluna = min(indices)
+    vazio = float("nan")
+
+    livro = load_workbook(caminho_planilha, read_only=True, data_only=True, keep_links=False)
+    try:
+        planilha = livro.worksheets[aba] if isinstance(aba, int) else livro[aba]
+        linhas = planilha.iter_rows(
+            min_row=primeira_linha,
+            max_row=ultima_linha,
+            min_col=primeira_coluna + 1,
+            max_col=max(indices) + 1,
+            values_only=True
+        )
+        for numero_linha, valores in enumerate(linhas, start=primeira_linha):
+            yield numero_linha, tuple(
+                _valor_celula(valores[indice - primeira_coluna]) if indice - primeira_coluna < len(valores) else vazio
+                for indice in indices
+            )
+    finally:
+        livro.close()
@@ -0,0 +1,183 @@
+"""
+Motor aproximado MinHash + LSH para catálogos muito grandes (1M+ referências).
+
+Cada descrição vira o conjunto dos seus trigramas de caracteres; a assinatura
+MinHash tem `bandas * linhas` valores e é dividida em `bandas` faixas de
+`linhas` valores. Duas descrições viram candidatas quando coincidem em pelo
+menos uma faixa, e só os candidatos passam pelo score exato (SequenceMatcher).
+
+Um par com similaridade de Jaccard `s` entre os trigramas colide com
+probabilidade 1 - (1 - s**linhas)**bandas: mais bandas aumentam o recall,
+mais linhas reduzem os candidatos (e o tempo).
+"""
+
+import zlib
+from typing import Callable, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+from corpus_referencia import CorpusReferencia
+from motores_similaridade import Correlacoes, parciais_ao_cancelar, pontuar_candidatos
+
+BANDAS_PADRAO = 32
+LINHAS_PADRAO = 3
+
+TAMANHO_NGRAMA = 3
+
+# Primo maior que 2**32; com x < 2**32 e a, b < 2**31, (a*x + b) não estoura o uint64
+_PRIMO = np.uint64(4294967311)
+
+# Trigramas processados por vez ao calcular assinaturas (limita a memória)
+NGRAMAS_POR_BLOCO = 2_000_000
+
+# Índice LSH por corpus: {(bandas, linhas): (tamanho do corpus, índice)}
+_indices: "WeakKeyDictionary[CorpusReferencia, dict]" = WeakKeyDictionary()
+
+
+def probabilidade_colisao(jaccard: float, bandas: int = BANDAS_PADRAO, linhas: int = LINHAS_PADRAO) -> float:
+    """Recall estimado: probabilidade de um par com essa similaridade de Jaccard virar candidato"""
+    return 1 - (1 - jaccard ** linhas) ** bandas
+
+
+def _ngramas(texto: str) -> List[int]:
+    q = TAMANHO_NGRAMA
+    if len(texto) < q:
+        return [zlib.crc32(texto.encode("utf-8"))]
+    return list({zlib.crc32(texto[i:i + q].encode("utf-8")) for i in range(len(texto) - q + 1)})
+
+
+def _coeficientes(quantidade: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Semente fixa: assinaturas do corpus e das consultas usam as mesmas funções de hash
+    gerador = np.random.default_rng(20240611)
+    a = gerador.integers(1, 2 ** 31, size=quantidade, dtype=np.uint64)
+    b = gerador.integers(0, 2 ** 31, size=quantidade, dtype=np.uint64)
+    return a, b
+
+
+def assinaturas_minhash(descricoes: List[str], quantidade: int) -> np.ndarray:
+    """Matriz (descrições × quantidade) com as assinaturas MinHash dos trigramas"""
+    a, b = _coeficientes(quantidade)
+    assinaturas = np.empty((len(descricoes), quantidade), dtype=np.uint64)
+
+    inicio = 0
+    while inicio < len(descricoes):
+        # Bloco de descrições com no máximo NGRAMAS_POR_BLOCO trigramas
+        ngramas, tamanhos, fim = [], [], inicio
+        while fim < len(descricoes) and (not ngramas or len(ngramas) < NGRAMAS_POR_BLOCO):
+            ids = _ngramas(descricoes[fim])
+            ngramas.extend(ids)
+            tamanhos.append(len(ids))
+            fim += 1
+
+        valores = np.asarray(ngramas, dtype=np.uint64)
+        deslocamentos = np.zeros(len(tamanhos), dtype=np.int64)
+        np.cumsum(tamanhos[:-1], out=deslocamentos[1:])
+        for i in range(quantidade):
+            hashes = (a[i] * valores + b[i]) % _PRIMO
+            assinaturas[inicio:fim, i] = np.minimum.reduceat(hashes, deslocamentos)
+        inicio = fim
+    return assinaturas
+
+
+def _chaves_das_bandas(assinaturas: np.ndarray, bandas: int, linhas: int) -> np.ndarray:
+    """Uma chave uint64 por (descrição, banda), combinando os valores da faixa"""
+    faixas = assinaturas.reshape(len(assinaturas), bandas, linhas)
+    chaves = np.zeros((len(assinaturas), bandas), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(linhas):
+            chaves = chaves * np.uint64(1000003) + faixas[:, :, j]
+    return chaves
+
+
+class IndiceLSH:
+    """Chaves das bandas do corpus, ordenadas por banda para busca binária"""
+
+    def __init__(self, descricoes: List[str], bandas: int, linhas: int):
+        self.bandas = bandas
+        self.linhas = linhas
+        chaves = _chaves_das_bandas(assinaturas_minhash(descricoes, bandas * linhas), bandas, linhas)
+        self.ordens = [np.argsort(chaves[:, banda], kind="stable").astype(np.int32) for banda in range(bandas)]
+        self.chaves = [chaves[ordem, banda] for banda, ordem in enumerate(self.ordens)]
+
+    def candidatos(self, chaves_consulta: np.ndarray) -> np.ndarray:
+        """Posições (ordem crescente) que colidem com a consulta em pelo menos uma banda"""
+        encontrados = []
+        for banda, chave in enumerate(chaves_consulta):
+            inicio = np.searchsorted(self.chaves[banda], chave, side="left")
+            fim = np.searchsorted(self.chaves[banda], chave, side="right")
+            if fim > inicio:
+                encontrados.append(self.ordens[banda][inicio:fim])
+        if not encontrados:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(encontrados))
+
+
+def _indice(corpus: CorpusReferencia, bandas: int, linhas: int) -> IndiceLSH:
+    indices = _indices.setdefault(corpus, {})
+    tamanho, indice = indices.get((bandas, linhas), (None, None))
+    if indice is None or tamanho != len(corpus):
+        indice = IndiceLSH(corpus.descricoes_normalizadas, bandas, linhas)
+        indices[(bandas, linhas)] = (len(corpus), indice)
+    return indice
+
+
+def correlacionar_minhash(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0,
+    bandas: int = BANDAS_PADRAO,
+    linhas: int = LINHAS_PADRAO,
+    comprimento_maximo: int = 0,
+    tempo_maximo_par: float = 0.0
+) -> Correlacoes:
+    """
+    Só as referências que colidem em algum bucket LSH recebem o score exato;
+    correlações fora dos buckets podem ser perdidas (ver `probabilidade_colisao`).
+    """
+    if not descricoes_orcamento or not len(corpus):
+        return [[] for _ in descricoes_orcamento]
+
+    indice = _indice(corpus, bandas, linhas)
+    chaves = _chaves_das_bandas(assinaturas_minhash(descricoes_orcamento, bandas * linhas), bandas, linhas)
+
+    correlacoes = []
+    with parciais_ao_cancelar(correlacoes):
+        for descricao_orc, chaves_item in zip(descricoes_orcamento, chaves):
+            if ao_progredir:
+                ao_progredir()
+            candidatos = indice.candidatos(chaves_item).tolist()
+            correlacoes.append(pontuar_candidatos(
+                descricao_orc, candidatos, corpus, taxa, limite, comprimento_maximo, tempo_maximo_par
+            ))
+    return correlacoes
+
+
+def estimar_recall(
+    descricoes_amostra: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    bandas: int = BANDAS_PADRAO,
+    linhas: int = LINHAS_PADRAO
+) -> Optional[float]:
+    """
+    Recall medido em uma amostra de descrições: fração das correlações exatas
+    (SequenceMatcher) que o LSH também encontra. None quando a amostra não tem
+    nenhuma correlação exata. As exatas vêm só da janela de comprimento, sem
+    construir o índice de n-gramas do corpus inteiro.
+    """
+    exatas = [
+        pontuar_candidatos(descricao, corpus.janela_comprimento(len(descricao), taxa), corpus, taxa)
+        for descricao in descricoes_amostra
+    ]
+    aproximadas = correlacionar_minhash(descricoes_amostra, corpus, taxa, bandas=bandas, linhas=linhas)
+    total = sum(len(encontrados) for encontrados in exatas)
+    if not total:
+        return None
+    acertos = sum(
+        len({posicao for posicao, _ in exato} & {posicao for posicao, _ in aproximado})
+        for exato, aproximado in zip(exatas, aproximadas)
+    )
+    return acertos / total
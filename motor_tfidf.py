@@ -0,0 +1,85 @@
+"""
+Motor TF-IDF de n-gramas de caracteres com similaridade do cosseno (top-k).
+
+Pensado para catálogos muito grandes (SINAPI): as descrições viram uma matriz
+esparsa TF-IDF e cada bloco de itens do orçamento é comparado com todo o
+catálogo em um único produto de matrizes esparsas.
+"""
+
+from typing import Callable, List, Optional
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from corpus_referencia import CorpusReferencia
+from motores_similaridade import Correlacoes, parciais_ao_cancelar
+
+# Limite de células (itens do bloco × referências) por produto esparso
+CELULAS_POR_BLOCO = 5_000_000
+
+# Quantidade máxima de referências devolvidas por item do orçamento
+TOP_K_PADRAO = 50
+
+# Vetorizador ajustado por corpus: (tamanho do corpus, vetorizador, matriz das referências)
+_modelos: "WeakKeyDictionary[CorpusReferencia, tuple]" = WeakKeyDictionary()
+
+
+def _modelo(corpus: CorpusReferencia):
+    modelo = _modelos.get(corpus)
+    if modelo is None or modelo[0] != len(corpus):
+        vetorizador = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=(3, 3),
+            lowercase=False,  # descrições já normalizadas pelo corpus
+            sublinear_tf=True,
+            dtype=np.float32
+        )
+        matriz_referencia = vetorizador.fit_transform(corpus.descricoes_normalizadas)
+        modelo = (len(corpus), vetorizador, matriz_referencia.T.tocsr())
+        _modelos[corpus] = modelo
+    return modelo[1], modelo[2]
+
+
+def correlacionar_tfidf(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    top_k: int = TOP_K_PADRAO
+) -> Correlacoes:
+    """
+    Retorna, para cada item, até `top_k` referências com cosseno > taxa
+    (score 0-1, exibido na escala 0-100 como os demais motores).
+    """
+    if not descricoes_orcamento or not len(corpus):
+        return [[] for _ in descricoes_orcamento]
+
+    vetorizador, matriz_referencia_t = _modelo(corpus)
+    linhas_por_bloco = max(1, CELULAS_POR_BLOCO // len(corpus))
+
+    correlacoes = []
+    with parciais_ao_cancelar(correlacoes):
+        for inicio in range(0, len(descricoes_orcamento), linhas_por_bloco):
+            bloco = vetorizador.transform(descricoes_orcamento[inicio:inicio + linhas_por_bloco])
+            # Vetores TF-IDF já são normalizados (L2): o produto é o cosseno
+            scores = (bloco @ matriz_referencia_t).tocsr()
+
+            for linha in range(scores.shape[0]):
+                if ao_progredir:
+                    ao_progredir()
+
+                inicio_linha, fim_linha = scores.indptr[linha], scores.indptr[linha + 1]
+                posicoes = scores.indices[inicio_linha:fim_linha]
+                valores = scores.data[inicio_linha:fim_linha]
+
+                acima = valores > taxa
+                posicoes, valores = posicoes[acima], valores[acima]
+                if len(valores) > top_k:
+                    melhores = np.argpartition(-valores, top_k - 1)[:top_k]
+                    posicoes, valores = posicoes[melhores], valores[melhores]
+
+                ordem = np.argsort(posicoes)
+                # Cosseno pode passar de 1.0 por arredondamento em float32
+                correlacoes.append([(int(posicoes[i]), min(float(valores[i]), 1.0)) for i in ordem])
+    return correlacoes
@@ -0,0 +1,442 @@
+"""
+Motores de correlação entre descrições do orçamento e da referência.
+
+Cada motor recebe as descrições do orçamento já normalizadas (mesma
+normalização do corpus) e o CorpusReferencia, e devolve, para cada item do
+orçamento, a lista de (posição no corpus, score 0-1) com score > taxa, em
+ordem crescente de posição (mesma ordem da varredura original).
+
+Com `limite` > 0 cada item guarda só os `limite` melhores scores (empates
+ficam com a referência de menor posição), mantendo a memória e o preenchimento
+das grids limitados mesmo para itens genéricos ("Cabo", "Tubo").
+
+`ao_progredir` é chamado a cada item, antes de correlacioná-lo (nos motores
+vetorizados, a cada linha do bloco já calculado). Se levantar
+OperacaoCancelada, a exceção segue com as correlações dos itens já concluídos
+em `parciais` (sempre os primeiros da lista recebida).
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from corpus_referencia import CorpusReferencia, reduzir_descricao, COMPRIMENTO_REDUZIDO_PADRAO
+from pontuadores import matriz_de_scores
+from progresso import OperacaoCancelada
+
+# Limite de células da matriz de scores calculada por bloco (~200 MB em float64)
+CELULAS_POR_BLOCO = 25_000_000
+
+# Motor "rerank": candidatos por item trazidos pelo pontuador barato para o score exato
+CANDIDATOS_RERANK_PADRAO = 50
+
+Correlacoes = List[List[Tuple[int, float]]]
+
+
+def limitar_melhores(encontrados: List[Tuple[int, float]], limite: int) -> List[Tuple[int, float]]:
+    """Mantém os `limite` maiores scores (0 = sem limite), devolvidos em ordem de posição"""
+    if not limite or len(encontrados) <= limite:
+        return encontrados
+    melhores = heapq.nlargest(limite, encontrados, key=lambda par: (par[1], -par[0]))
+    return sorted(melhores)
+
+
+@contextmanager
+def parciais_ao_cancelar(correlacoes: Correlacoes):
+    """Anexa a OperacaoCancelada as correlações já concluídas (`correlacoes`, preenchida pelo laço do motor)"""
+    try:
+        yield
+    except OperacaoCancelada as e:
+        e.parciais = list(correlacoes)
+        raise
+
+
+class ScoresCompactos:
+    """
+    Correlações guardadas em memória no formato CSR: posições (int32) e scores
+    (float64) de todos os itens em dois arrays contíguos, mais o deslocamento
+    de cada item. Calculadas uma vez com um piso de taxa, permitem aplicar
+    qualquer taxa >= piso só com uma máscara, sem recalcular similaridades.
+
+    Os scores ficam em float64 (e não em percentual inteiro) para que o corte
+    `score > taxa` continue idêntico ao dos motores.
+    """
+
+    def __init__(self, correlacoes: Correlacoes, piso: float):
+        self.piso = piso
+        tamanhos = [len(encontrados) for encontrados in correlacoes]
+        self.inicios = np.zeros(len(correlacoes) + 1, dtype=np.int64)
+        np.cumsum(tamanhos, out=self.inicios[1:])
+        self.posicoes = np.fromiter(
+            (posicao for encontrados in correlacoes for posicao, _ in encontrados),
+            dtype=np.int32, count=int(self.inicios[-1])
+        )
+        self.scores = np.fromiter(
+            (score for encontrados in correlacoes for _, score in encontrados),
+            dtype=np.float64, count=int(self.inicios[-1])
+        )
+
+    def __len__(self) -> int:
+        return len(self.inicios) - 1
+
+    def filtrar(self, taxa: float) -> Correlacoes:
+        """Correlações com score > taxa (ValueError se a taxa estiver abaixo do piso)"""
+        if taxa < self.piso:
+            raise ValueError(f"Taxa {taxa} abaixo do piso calculado ({self.piso})")
+        mantidos = np.nonzero(self.scores > taxa)[0]
+        # Onde cada item começa dentro dos mantidos (a ordem original é preservada)
+        cortes = np.searchsorted(mantidos, self.inicios).tolist()
+        pares = list(zip(self.posicoes[mantidos].tolist(), self.scores[mantidos].tolist()))
+        return [pares[inicio:fim] for inicio, fim in zip(cortes[:-1], cortes[1:])]
+
+
+def pontuar_candidatos(
+    descricao_orc: str,
+    candidatos,
+    corpus: CorpusReferencia,
+    taxa: float,
+    limite: int = 0,
+    comprimento_maximo: int = 0,
+    tempo_maximo_par: float = 0.0
+) -> List[Tuple[int, float]]:
+    """
+    Score exato (SequenceMatcher) dos candidatos, em ordem crescente de posição,
+    mantendo os com score > taxa.
+
+    Com `limite`, os melhores ficam em um heap de tamanho fixo; quando ele está
+    cheio, o menor score do heap passa a ser o corte da cascata.
+
+    Guarda de custo (o SequenceMatcher é quadrático no pior caso): descrições
+    com mais de `comprimento_maximo` caracteres são comparadas pela versão
+    reduzida, e um par que leva mais de `tempo_maximo_par` segundos faz o lado
+    mais longo passar a ser comparado reduzido dali em diante. A guarda de tempo
+    só alivia descrições maiores que o comprimento da versão reduzida
+    (`comprimento_maximo` ou COMPRIMENTO_REDUZIDO_PADRAO): um par lento de
+    descrições mais curtas continua sendo comparado inteiro. As descrições
+    efetivamente reduzidas ficam registradas no corpus (`consultas_reduzidas`,
+    `posicoes_reduzidas`).
+    """
+    guarda = comprimento_maximo or tempo_maximo_par
+    if comprimento_maximo and len(descricao_orc) > comprimento_maximo:
+        corpus.consultas_reduzidas.add(descricao_orc)
+        descricao_orc = reduzir_descricao(descricao_orc, comprimento_maximo)
+
+    encontrados = []
+    melhores: List[Tuple[float, int]] = []  # heap (score, -posicao) quando há limite
+    for posicao in candidatos:
+        corte = taxa
+        if limite and len(melhores) >= limite:
+            corte = max(taxa, melhores[0][0])
+
+        if not guarda:
+            score = corpus.similaridade_com_corte(descricao_orc, posicao, corte)
+        else:
+            inicio = time.perf_counter()
+            score = corpus.similaridade_limitada(descricao_orc, posicao, corte, comprimento_maximo)
+            if tempo_maximo_par and time.perf_counter() - inicio > tempo_maximo_par:
+                comprimento_reduzido = comprimento_maximo or COMPRIMENTO_REDUZIDO_PADRAO
+                if len(descricao_orc) >= len(corpus.descricoes_normalizadas[posicao]):
+                    # Só marca quando a redução muda o texto (descrições curtas não têm versão reduzida)
+                    if len(descricao_orc) > comprimento_reduzido:
+                        corpus.consultas_reduzidas.add(descricao_orc)
+                        descricao_orc = reduzir_descricao(descricao_orc, comprimento_reduzido)
+                elif len(corpus.descricoes_normalizadas[posicao]) > comprimento_reduzido:
+                    corpus.posicoes_pesadas.add(posicao)
+        if score is None or score <= corte:
+            continue
+
+        if not limite:
+            encontrados.append((posicao, score))
+        elif len(melhores) < limite:
+            heapq.heappush(melhores, (score, -posicao))
+        else:
+            heapq.heapreplace(melhores, (score, -posicao))
+
+    if limite:
+        encontrados = sorted((-posicao_negativa, score) for score, posicao_negativa in melhores)
+    return encontrados
+
+
+def correlacionar_sequencematcher(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0,
+    comprimento_maximo: int = 0,
+    tempo_maximo_par: float = 0.0
+) -> Correlacoes:
+    """
+    Motor de referência: SequenceMatcher par a par. Os candidatos são a janela
+    de comprimento e, quando o limite de contagem descarta algo na taxa (acima
+    de 2/3), só os dela que também passam pelo índice de n-gramas; depois vem a
+    cascata de limites superiores antes do ratio().
+    `comprimento_maximo` e `tempo_maximo_par`: ver `pontuar_candidatos`.
+    """
+    indice_ngramas = corpus.indice_ngramas(taxa)
+
+    correlacoes = []
+    with parciais_ao_cancelar(correlacoes):
+        for descricao_orc in descricoes_orcamento:
+            if ao_progredir:
+                ao_progredir()
+
+            candidatos = corpus.janela_comprimento(len(descricao_orc), taxa)
+            if indice_ngramas is not None:
+                # Os dois filtros são exatos; a interseção é menor que cada um
+                por_contagem = set(indice_ngramas.candidatos(descricao_orc, taxa))
+                candidatos = [posicao for posicao in candidatos if posicao in por_contagem]
+
+            correlacoes.append(pontuar_candidatos(
+                descricao_orc, candidatos, corpus, taxa, limite, comprimento_maximo, tempo_maximo_par
+            ))
+    return correlacoes
+
+
+def correlacionar_rapidfuzz(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0,
+    pontuador: str = "ratio"
+) -> Correlacoes:
+    """
+    Calcula a matriz orçamento × referência com o `pontuador` (pontuadores.py;
+    os do rapidfuzz usam `process.cdist` em todos os núcleos). A matriz é
+    calculada em blocos de linhas do orçamento para limitar a memória em
+    catálogos grandes.
+
+    Obs.: fuzz.ratio é baseado em LCS e não é idêntico ao SequenceMatcher;
+    para conferência use o motor "sequencematcher".
+    """
+    descricoes_referencia = corpus.descricoes_normalizadas
+    if not descricoes_orcamento or not descricoes_referencia:
+        return [[] for _ in descricoes_orcamento]
+
+    corte = taxa * 100
+    linhas_por_bloco = max(1, CELULAS_POR_BLOCO // len(descricoes_referencia))
+
+    correlacoes = []
+    with parciais_ao_cancelar(correlacoes):
+        for inicio in range(0, len(descricoes_orcamento), linhas_por_bloco):
+            bloco = descricoes_orcamento[inicio:inicio + linhas_por_bloco]
+            matriz = matriz_de_scores(pontuador, bloco, descricoes_referencia, corte, escala=100)
+            for linha in matriz:
+                if ao_progredir:
+                    ao_progredir()
+
+                posicoes = np.nonzero(linha > corte)[0]
+                encontrados = [(int(p), float(linha[p]) / 100) for p in posicoes]
+                correlacoes.append(limitar_melhores(encontrados, limite))
+    return correlacoes
+
+
+def correlacionar_rerank(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0,
+    candidatos: int = CANDIDATOS_RERANK_PADRAO,
+    pontuador: str = "ratio",
+    comprimento_maximo: int = 0,
+    tempo_maximo_par: float = 0.0
+) -> Correlacoes:
+    """
+    Dois estágios: um pontuador barato e vetorizado (`pontuador`, via
+    pontuadores.py) recupera os `candidatos` melhores de todo o catálogo para
+    cada item, e só esses recebem o score exato do SequenceMatcher (mesma
+    escala e mesmo corte do motor "sequencematcher"). O custo cai de N×M
+    chamadas ao ratio() para N×`candidatos`. O padrão fuzz.ratio (LCS) é o
+    que mais se aproxima do SequenceMatcher na ordem dos candidatos.
+
+    Obs.: aproximado; uma referência fora dos `candidatos` do primeiro estágio
+    não é encontrada, mesmo que o SequenceMatcher a aprovasse.
+    """
+    descricoes_referencia = corpus.descricoes_normalizadas
+    if not descricoes_orcamento or not descricoes_referencia:
+        return [[] for _ in descricoes_orcamento]
+
+    linhas_por_bloco = max(1, CELULAS_POR_BLOCO // len(descricoes_referencia))
+
+    correlacoes = []
+    with parciais_ao_cancelar(correlacoes):
+        for inicio in range(0, len(descricoes_orcamento), linhas_por_bloco):
+            bloco = descricoes_orcamento[inicio:inicio + linhas_por_bloco]
+            matriz = matriz_de_scores(pontuador, bloco, descricoes_referencia)
+            for descricao_orc, linha in zip(bloco, matriz):
+                if ao_progredir:
+                    ao_progredir()
+
+                if 0 < candidatos < len(linha):
+                    melhores = np.argpartition(linha, len(linha) - candidatos)[len(linha) - candidatos:]
+                else:
+                    melhores = np.arange(len(linha))
+                correlacoes.append(pontuar_candidatos(
+                    descricao_orc, np.sort(melhores).tolist(), corpus, taxa, limite, comprimento_maximo, tempo_maximo_par
+                ))
+    return correlacoes
+
+
+def correlacionar_tfidf(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0
+) -> Correlacoes:
+    """Cosseno TF-IDF de n-gramas de caracteres, top-k por item (requer scikit-learn)"""
+    from motor_tfidf import correlacionar_tfidf as correlacionar, TOP_K_PADRAO
+    return correlacionar(descricoes_orcamento, corpus, taxa, ao_progredir=ao_progredir, top_k=limite or TOP_K_PADRAO)
+
+
+def correlacionar_minhash(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    ao_progredir: Optional[Callable[[], None]] = None,
+    limite: int = 0,
+    bandas: int = 0,
+    linhas: int = 0,
+    comprimento_maximo: int = 0,
+    tempo_maximo_par: float = 0.0
+) -> Correlacoes:
+    """MinHash + LSH: score exato só para as referências dos mesmos buckets (aproximado)"""
+    from motor_minhash import correlacionar_minhash as correlacionar, BANDAS_PADRAO, LINHAS_PADRAO
+    return correlacionar(
+        descricoes_orcamento, corpus, taxa,
+        ao_progredir=ao_progredir,
+        limite=limite,
+        bandas=bandas or BANDAS_PADRAO,
+        linhas=linhas or LINHAS_PADRAO,
+        comprimento_maximo=comprimento_maximo,
+        tempo_maximo_par=tempo_maximo_par
+    )
+
+
+def correlacionar_com_atalho_exato(
+    descricoes_orcamento: List[str],
+    corpus: CorpusReferencia,
+    taxa: float,
+    correlacionar: Callable[[List[str]], Correlacoes],
+    pular_fuzzy_quando_exato: bool = False,
+    limite: int = 0
+) -> Correlacoes:
+    """
+    Consulta primeiro o dicionário descrição normalizada → referências do corpus.
+    Correspondências exatas entram com score 1.0 (100%). Com
+    `pular_fuzzy_quando_exato`, os itens com correspondência exata não passam
+    pelo motor fuzzy; caso contrário o motor roda normalmente e as exatas são
+    apenas garantidas no resultado.
+
+    Args:
+        correlacionar: Função que aplica o motor fuzzy a uma lista de descrições
+    """
+    # Score 1.0 só é aceito se for maior que a taxa (mesma regra dos motores)
+    exatos = [corpus.posicoes_exatas(descricao) if 1.0 > taxa else [] for descricao in descricoes_orcamento]
+    pendentes = [
+        i for i, posicoes in enumerate(exatos)
+        if not (posicoes and pular_fuzzy_quando_exato)
+    ]
+
+    correlacoes: Correlacoes = [
+        limitar_melhores([(posicao, 1.0) for posicao in posicoes], limite)
+        for posicoes in exatos
+    ]
+    if not pendentes:
+        return correlacoes
+
+    try:
+        correlacoes_fuzzy = correlacionar([descricoes_orcamento[i] for i in pendentes])
+    except OperacaoCancelada as e:
+        # Concluídos: os itens antes do primeiro pendente que o motor não alcançou
+        correlacoes_fuzzy = e.parciais or []
+        corte = pendentes[len(correlacoes_fuzzy)] if len(correlacoes_fuzzy) < len(pendentes) else len(correlacoes)
+        e.parciais = _mesclar_exatos(correlacoes, exatos, pendentes, correlacoes_fuzzy, limite)[:corte]
+        raise
+    return _mesclar_exatos(correlacoes, exatos, pendentes, correlacoes_fuzzy, limite)
+
+
+def _mesclar_exatos(
+    correlacoes: Correlacoes,
+    exatos: List[List[int]],
+    pendentes: List[int],
+    correlacoes_fuzzy: Correlacoes,
+    limite: int
+) -> Correlacoes:
+    """Coloca o resultado do motor fuzzy nos itens pendentes, garantindo as correspondências exatas"""
+    for i, encontrados in zip(pendentes, correlacoes_fuzzy):
+        ja_encontradas = {posicao for posicao, _ in encontrados}
+        faltantes = [(posicao, 1.0) for posicao in exatos[i] if posicao not in ja_encontradas]
+        if faltantes:
+            encontrados = limitar_melhores(sorted(encontrados + faltantes), limite)
+        correlacoes[i] = encontrados
+    return correlacoes
+
+
+class CacheCorrelacoes:
+    """
+    Correlações por descrição normalizada do orçamento, mantidas durante a
+    sessão: cada descrição distinta é correlacionada uma única vez, mesmo que
+    se repita no orçamento ou volte em outro intervalo de linhas.
+
+    A versão identifica tudo o que muda o resultado (assinatura do corpus,
+    motor, taxa, limite...); só as descrições ainda não vistas naquela versão
+    são correlacionadas. Guarda as `maximo_versoes` versões mais recentes.
+    """
+
+    def __init__(self, maximo_versoes: int = 8):
+        self.maximo_versoes = maximo_versoes
+        self._por_versao: "OrderedDict[tuple, Dict[str, List[Tuple[int, float]]]]" = OrderedDict()
+
+    def correlacionar(
+        self,
+        versao: tuple,
+        descricoes_orcamento: List[str],
+        correlacionar: Callable[[List[str]], Correlacoes]
+    ) -> Correlacoes:
+        cache = self._por_versao.setdefault(versao, {})
+        self._por_versao.move_to_end(versao)
+        while len(self._por_versao) > self.maximo_versoes:
+            self._por_versao.popitem(last=False)
+
+        faltantes = [descricao for descricao in dict.fromkeys(descricoes_orcamento) if descricao not in cache]
+        if faltantes:
+            try:
+                cache.update(zip(faltantes, correlacionar(faltantes)))
+            except OperacaoCancelada as e:
+                # O que foi concluído fica no cache (a próxima execução continua daí)
+                cache.update(zip(faltantes, e.parciais or []))
+                concluidos = len(descricoes_orcamento)
+                for indice, descricao in enumerate(descricoes_orcamento):
+                    if descricao not in cache:
+                        concluidos = indice
+                        break
+                e.parciais = [cache[descricao] for descricao in descricoes_orcamento[:concluidos]]
+                raise
+        return [cache[descricao] for descricao in descricoes_orcamento]
+
+    def limpar(self):
+        self._por_versao.clear()
+
+
+MOTORES: Dict[str, Callable[..., Correlacoes]] = {
+    "sequencematcher": correlacionar_sequencematcher,
+    "rapidfuzz": correlacionar_rapidfuzz,
+    "tfidf": correlacionar_tfidf,
+    "rerank": correlacionar_rerank,
+    "minhash": correlacionar_minhash,
+}
+
+
+def obter_motor(nome: str) -> Callable[..., Correlacoes]:
+    """Retorna o motor de correlação pelo nome (ValueError se não existir)"""
+    try:
+        return MOTORES[nome]
+    except KeyError:
+        raise ValueError(f"Motor de similaridade desconhecido: {nome}. Opções: {', '.join(MOTORES)}")
@@ -0,0 +1,93 @@
+"""
+Pontuadores de similaridade entre textos, compartilhados por ProcessamentoBase,
+Correlacionador e DataModel.
+
+Todos têm a mesma interface em lote: uma consulta contra várias escolhas,
+com corte, na escala pedida por quem chama (`escala=1` para 0-1, `escala=100`
+para 0-100). Os scores >= corte são exatos; os abaixo do corte podem vir como 0
+(os pontuadores usam o corte para descartar cedo).
+
+Os textos são comparados como recebidos: normalização (minúsculas, acentos)
+fica com quem chama, como já acontece nos motores e no Correlacionador.
+"""
+
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+Pontuador = Callable[..., np.ndarray]
+
+
+def pontuar_sequencematcher(consulta: str, escolhas: Sequence[str], corte: float = 0.0, escala: float = 1.0) -> np.ndarray:
+    """SequenceMatcher(None, consulta, escolha).ratio() de cada escolha (modo de referência)"""
+    taxa = corte / escala
+    scores = np.zeros(len(escolhas), dtype=np.float64)
+    matcher = SequenceMatcher(None, consulta, "")
+    for i, escolha in enumerate(escolhas):
+        matcher.set_seq2(escolha)
+        # Limites superiores baratos antes do ratio() completo (mesmo denominador: corte exato)
+        if matcher.real_quick_ratio() < taxa or matcher.quick_ratio() < taxa:
+            continue
+        scores[i] = matcher.ratio() * escala
+    return scores
+
+
+def _pontuador_rapidfuzz(scorer) -> Pontuador:
+    """Pontuador a partir de um scorer 0-100 do rapidfuzz (process.cdist, todos os núcleos)"""
+    def pontuar(consulta: str, escolhas: Sequence[str], corte: float = 0.0, escala: float = 1.0) -> np.ndarray:
+        return matriz_rapidfuzz(scorer, [consulta], escolhas, corte, escala)[0]
+    pontuar.scorer_rapidfuzz = scorer
+    return pontuar
+
+
+def matriz_rapidfuzz(scorer, consultas: Sequence[str], escolhas: Sequence[str], corte: float = 0.0, escala: float = 1.0) -> np.ndarray:
+    matriz = process.cdist(
+        consultas,
+        escolhas,
+        scorer=scorer,
+        score_cutoff=corte * (100 / escala),
+        dtype=np.float64,
+        workers=-1
+    )
+    if escala != 100:
+        matriz /= 100 / escala
+    return matriz
+
+
+PONTUADORES: Dict[str, Pontuador] = {
+    "sequencematcher": pontuar_sequencematcher,
+    "ratio": _pontuador_rapidfuzz(fuzz.ratio),
+    "wratio": _pontuador_rapidfuzz(fuzz.WRatio),
+    "token_set_ratio": _pontuador_rapidfuzz(fuzz.token_set_ratio),
+    "token_sort_ratio": _pontuador_rapidfuzz(fuzz.token_sort_ratio),
+}
+
+
+def obter_pontuador(nome: str) -> Pontuador:
+    """Retorna o pontuador pelo nome (ValueError se não existir)"""
+    try:
+        return PONTUADORES[nome]
+    except KeyError:
+        raise ValueError(f"Pontuador desconhecido: {nome}. Opções: {', '.join(PONTUADORES)}")
+
+
+def matriz_de_scores(nome: str, consultas: Sequence[str], escolhas: Sequence[str], corte: float = 0.0, escala: float = 1.0) -> np.ndarray:
+    """
+    Matriz consultas × escolhas do pontuador. Os pontuadores do rapidfuzz
+    calculam a matriz inteira de uma vez; os demais, uma consulta por linha.
+    """
+    pontuador = obter_pontuador(nome)
+    scorer = getattr(pontuador, "scorer_rapidfuzz", None)
+    if scorer is not None:
+        return matriz_rapidfuzz(scorer, consultas, escolhas, corte, escala)
+    matriz = np.zeros((len(consultas), len(escolhas)), dtype=np.float64)
+    for i, consulta in enumerate(consultas):
+        matriz[i] = pontuador(consulta, escolhas, corte, escala)
+    return matriz
+
+
+def similaridade(a: str, b: str, nome: str = "sequencematcher") -> float:
+    """Score 0-1 de um único par"""
+    return float(obter_pontuador(nome)(a, [b])[0])
@@ -1,14 +1,23 @@
+import numpy as np
 import pandas as pd
-from difflib import SequenceMatcher
 import tkinter as tk
 from tkinter import ttk, messagebox
-from typing import List, Dict
+from typing import Dict, Iterator, List, Set, Tuple
 import logging
+import os
 import sys
 from pathlib import Path
 from datetime import datetime
 from ParametrosProcessamento import ParametrosProcessamento
 from tela_checkin import ItemCheckin
+from corpus_referencia import CorpusReferencia
+from ConversorMedidas import ConversorMedidas
+from cache_referencia import carregar_corpus, salvar_corpus
+from motores_similaridade import obter_motor, correlacionar_com_atalho_exato, CacheCorrelacoes, ScoresCompactos
+from execucao_paralela import correlacionar_em_paralelo
+from progresso import Progresso, OperacaoCancelada
+from leitura_planilhas import ler_colunas, iterar_linhas, sessao
+from pontuadores import similaridade as similaridade_par
 
 # Configurar logging
 Path("logs").mkdir(exist_ok=True)
@@ -30,15 +39,38 @@ if not logger.handlers:
     logger.addHandler(console_handler)
     logger.addHandler(file_handler)
 
+# Correlações já calculadas na sessão: reprocessar outro intervalo de linhas só correlaciona descrições novas
+_cache_correlacoes = CacheCorrelacoes()
+
+# Linhas do orçamento por lote em processar_em_lotes
+TAMANHO_LOTE = 200
+
+# Sem PisoTaxaSimilaridade, os scores são guardados a partir de taxa - MARGEM_PISO (mínimo 0)
+MARGEM_PISO = 0.15
+
+# Descrições do orçamento usadas para medir o recall do motor "minhash" contra o exato (0 = não mede)
+AMOSTRA_RECALL_LSH = 20
+
+
 class ProcessamentoBase:
     """Classe base para processamento de dados"""
-    def __init__(self, parametros, janela_progresso=None):
+    def __init__(self, parametros, janela_progresso=None, progresso: Progresso = None):
         self.parametros = parametros
         self.janela_progresso = janela_progresso
+        # Linhas concluídas/ETA, cancelamento e prazo de processar_dados e processar_em_lotes
+        self.progresso = progresso
+        self._progresso_ativo = None  # Progresso verificado e avançado a cada item enquanto os itens são correlacionados
+        self._limite_progresso = 0  # Avanço máximo durante a correlação em curso (linhas passadas a ela)
+        self.descricoes_reduzidas: List[str] = []  # Comparadas pela versão reduzida (guarda de custo) no último processamento
+        # Guardados do último processamento para "mostrar mais" referências de um item
+        self.corpus = None
+        self.itens_orcamento = []
+        self.scores = None  # ScoresCompactos calculados no piso (mudança de taxa sem recalcular)
+        self._indices_em_disco: Set[int] = set()  # Tamanhos de n-grama já gravados no índice em disco do corpus
 
     @staticmethod
     def similaridade(a, b):
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+        return similaridade_par(a.lower(), b.lower())
 
     @staticmethod
     def transformacaoIndiceColuna(coluna: str) -> int:
@@ -49,10 +81,12 @@ class ProcessamentoBase:
         return indice - 1
     
     @staticmethod
-    def validadorDeLinhasReferencia(linha: pd.Series, IndiceColunadescricao: int, IndiceColunamaterial: int, IndiceColuna_mao_de_obra: int) -> bool:
-        descricaoValida = not pd.isna(linha.iloc[IndiceColunadescricao]) and str(linha.iloc[IndiceColunadescricao]).strip() != ""
-        materialValido = not pd.isna(linha.iloc[IndiceColunamaterial]) and str(linha.iloc[IndiceColunamaterial]).strip() != ""
-        maoDeObraValida = not pd.isna(linha.iloc[IndiceColuna_mao_de_obra]) and str(linha.iloc[IndiceColuna_mao_de_obra]).strip() != ""
+    def validadorDeLinhasReferencia(linha, IndiceColunadescricao: int, IndiceColunamaterial: int, IndiceColuna_mao_de_obra: int) -> bool:
+        # Aceita a linha como pd.Series ou como tupla (leitura em streaming)
+        valores = linha.iloc if isinstance(linha, pd.Series) else linha
+        descricaoValida = not pd.isna(valores[IndiceColunadescricao]) and str(valores[IndiceColunadescricao]).strip() != ""
+        materialValido = not pd.isna(valores[IndiceColunamaterial]) and str(valores[IndiceColunamaterial]).strip() != ""
+        maoDeObraValida = not pd.isna(valores[IndiceColuna_mao_de_obra]) and str(valores[IndiceColuna_mao_de_obra]).strip() != ""
         return descricaoValida and materialValido and maoDeObraValida
     
     @staticmethod
@@ -62,105 +96,493 @@ class ProcessamentoBase:
         return descricaoValida and unidadeMedidaValida
 
     def processar_dados(self) -> Dict[str, List[Dict]]:
-        """Processa os dados das planilhas e retorna os resultados"""
+        """
+        Processa os dados das planilhas e retorna os resultados. Com progresso
+        cancelado ou prazo esgotado, retorna só as linhas já correlacionadas
+        (o motivo fica em `progresso.interrompido`).
+        """
         try:
-            colunaDescricaoOrcamento = self.parametros.orcamento.coluna_descrição
-            indiceDaColunaOrcamento = self.transformacaoIndiceColuna(colunaDescricaoOrcamento)
-            
-            colunaDescricaoReferencia = self.parametros.referencia.coluna_descrição
-            indiceDaColunaReferencia = self.transformacaoIndiceColuna(colunaDescricaoReferencia)
+            progresso = self._progresso_da_execucao()
+            corpus, itens_orcamento, gravar_indice = self._preparar_dados()
+            taxa = self.parametros.pesquisa.TaxaSimilaridade
+
+            descricoes_orcamento = [corpus.normalizar(descricao) for _, descricao, _ in itens_orcamento]
+            unidades_orcamento = [unidade for _, _, unidade in itens_orcamento]
+
+            # Scores calculados uma vez no piso; a taxa pedida é só uma máscara sobre eles
+            piso = self._piso(taxa)
+            limite = self.parametros.pesquisa.MaximoCandidatos
+            if progresso is None:
+                correlacoes = self._correlacionar(descricoes_orcamento, unidades_orcamento, corpus, limite, piso)
+            else:
+                progresso.iniciar(len(itens_orcamento))
+                correlacoes = self._correlacionar_com_progresso(
+                    progresso, descricoes_orcamento, unidades_orcamento, corpus, limite, piso
+                )
+                if len(correlacoes) < len(itens_orcamento):
+                    logger.warning(
+                        f"Processamento interrompido ({progresso.interrompido}): "
+                        f"{len(correlacoes)} de {len(itens_orcamento)} linhas correlacionadas"
+                    )
+                    itens_orcamento = itens_orcamento[:len(correlacoes)]
+                    descricoes_orcamento = descricoes_orcamento[:len(correlacoes)]
+                    self.itens_orcamento = itens_orcamento
+            self.scores = ScoresCompactos(correlacoes, piso)
+            logger.debug(f"Descrições distintas: {len(set(descricoes_orcamento))} de {len(descricoes_orcamento)}")
+            self._registrar_descricoes_reduzidas(corpus, itens_orcamento)
+            if self.parametros.pesquisa.MotorSimilaridade == "minhash" and self.parametros.pesquisa.MedirRecallLSH:
+                self._registrar_recall_lsh(corpus, descricoes_orcamento, piso)
+
+            # Gravado depois da correlação para incluir as estruturas construídas sob demanda
+            self._gravar_corpus(corpus, gravar_indice)
+
+            return self._montar_resultados(itens_orcamento, self.scores.filtrar(taxa), corpus)
+        
+        except Exception as e:
+            raise e
 
-            colunaMaterialReferencia = self.parametros.referencia.coluna_material
-            indiceDaColunaMaterialReferencia = self.transformacaoIndiceColuna(colunaMaterialReferencia)
-            colunaMaoDeObraReferencia = self.parametros.referencia.coluna_mao_de_obra
-            indiceDaColunaMaoDeObraReferencia = self.transformacaoIndiceColuna(colunaMaoDeObraReferencia)
-            colunaUnidadeMedidaReferencia = self.parametros.referencia.coluna_unidade_medida
-            indiceDaColunaUnidadeMedidaReferencia = self.transformacaoIndiceColuna(colunaUnidadeMedidaReferencia)
+    def _piso(self, taxa: float) -> float:
+        """
+        Taxa a partir da qual os scores são calculados: PisoTaxaSimilaridade
+        ou, sem ele, `taxa - MARGEM_PISO`, para que baixar a taxa na tela de
+        correlação até esse ponto seja só uma máscara (sem recalcular).
+        """
+        piso = self.parametros.pesquisa.PisoTaxaSimilaridade
+        if piso is None:
+            piso = max(round(taxa - MARGEM_PISO, 6), 0.0)
+        return min(taxa, piso)
 
-            linha_inicio = self.parametros.pesquisa.ComecoPesquisa
-            linha_fim = self.parametros.pesquisa.TerminoPesquisa
+    def processar_em_lotes(self, tamanho_lote: int = TAMANHO_LOTE) -> Iterator[List[Dict]]:
+        """
+        Versão em streaming de processar_dados: entrega os resultados a cada lote
+        de `tamanho_lote` linhas do orçamento, assim que o lote é correlacionado.
+        Quem consome pode agrupar, exibir ou gravar em disco enquanto o restante
+        ainda é processado, sem montar a lista completa de resultados.
+        """
+        progresso = self._progresso_da_execucao()
+        corpus, itens_orcamento, gravar_indice = self._preparar_dados()
+        taxa = self.parametros.pesquisa.TaxaSimilaridade
+        piso = self._piso(taxa)
+        if progresso is not None:
+            progresso.iniciar(len(itens_orcamento))
+
+        for inicio in range(0, len(itens_orcamento), tamanho_lote):
+            lote = itens_orcamento[inicio:inicio + tamanho_lote]
+            descricoes = [corpus.normalizar(descricao) for _, descricao, _ in lote]
+            unidades = [unidade for _, _, unidade in lote]
+            if progresso is None:
+                correlacoes = self._correlacionar(descricoes, unidades, corpus, self.parametros.pesquisa.MaximoCandidatos, piso)
+            else:
+                if progresso.deve_parar:
+                    logger.warning(f"Processamento em lotes interrompido ({progresso.interrompido}) após {inicio} linhas")
+                    break
+                correlacoes = self._correlacionar_com_progresso(
+                    progresso, descricoes, unidades, corpus, self.parametros.pesquisa.MaximoCandidatos, piso
+                )
+            yield self._montar_resultados(
+                lote[:len(correlacoes)],
+                [[(posicao, score) for posicao, score in encontrados if score > taxa] for encontrados in correlacoes],
+                corpus
+            )
+            if len(correlacoes) < len(lote):
+                logger.warning(
+                    f"Processamento em lotes interrompido ({progresso.interrompido}) após {inicio + len(correlacoes)} linhas"
+                )
+                break
+
+        self._gravar_corpus(corpus, gravar_indice)
+
+    def _gravar_corpus(self, corpus: CorpusReferencia, gravar_indice: bool):
+        """
+        Grava o corpus no índice em disco se ele não estava lá ou se ganhou um
+        índice de n-gramas de outro tamanho (outra faixa de taxa) nesta execução.
+        """
+        novos = set(corpus.indices_ngramas_construidos) - self._indices_em_disco
+        if gravar_indice or (self.parametros.pesquisa.UsarIndiceEmDisco and novos):
+            salvar_corpus(self.parametros.referencia, corpus)
+            self._indices_em_disco = set(corpus.indices_ngramas_construidos)
+
+    def _preparar_dados(self) -> Tuple[CorpusReferencia, List[Tuple[int, str, str]], bool]:
+        """
+        Lê as planilhas e devolve o corpus de referência, os itens válidos do
+        orçamento (número da linha, descrição, unidade) e se o índice em disco
+        deve ser gravado ao final.
+        """
+        linha_inicio = self.parametros.pesquisa.ComecoPesquisa
+        linha_fim = self.parametros.pesquisa.TerminoPesquisa
+
+        # Só a descrição e a unidade, só nas linhas pesquisadas (índice = linha do Excel).
+        # A unidade do orçamento é lida na mesma letra da coluna de unidade da referência.
+        orcamento = ler_colunas(
+            self.parametros.orcamento.caminho_planilha,
+            {
+                "descricao": self.parametros.orcamento.coluna_descrição,
+                "unidade": self.parametros.referencia.coluna_unidade_medida
+            },
+            aba=self.parametros.orcamento.aba,
+            primeira_linha=linha_inicio,
+            ultima_linha=linha_fim
+        )
+
+        # Corpus de referências: do índice em disco quando a planilha não mudou
+        remover_acentos = self.parametros.pesquisa.IgnorarAcentos
+        corpus = None
+        if self.parametros.pesquisa.UsarIndiceEmDisco:
+            corpus = carregar_corpus(self.parametros.referencia, remover_acentos)
+            logger.debug(f"Índice de referência em disco: {'carregado' if corpus is not None else 'ausente'}")
+            self._indices_em_disco = set() if corpus is None else set(corpus.indices_ngramas_construidos)
+        gravar_indice = corpus is None and self.parametros.pesquisa.UsarIndiceEmDisco
+        if corpus is None:
+            # Montado uma vez por sessão: a próxima execução com a mesma planilha não a relê
+            referencia = self.parametros.referencia
+            corpus = sessao.obter(
+                referencia.caminho_planilha,
+                (
+                    "corpus",
+                    referencia.aba,
+                    referencia.coluna_descrição.upper(),
+                    referencia.coluna_material.upper(),
+                    referencia.coluna_mao_de_obra.upper(),
+                    referencia.coluna_unidade_medida.upper(),
+                    remover_acentos,
+                ),
+                self._montar_corpus_referencia,
+                lambda _: os.path.getsize(referencia.caminho_planilha)
+            )
 
-            referencia = pd.read_excel(self.parametros.referencia.caminho_planilha, sheet_name=self.parametros.referencia.aba)
-            orcamento = pd.read_excel(self.parametros.orcamento.caminho_planilha, sheet_name=self.parametros.orcamento.aba)
+        logger.debug(f"Referências válidas: {len(corpus)}")
 
-            # Arredonda os valores numéricos nas colunas de material e mão de obra (2 casas decimais)
+        itens_orcamento = []
+        for numero_linha_planilha, row_orc in orcamento.iterrows():
+            if not self.validadorDeLinhasOrcamento(row_orc, 0, 1):
+                continue
+            descricao_orc = str(row_orc["descricao"]).strip()  # Normalizar: remover espaços
+            unidade_orc = str(row_orc["unidade"]).strip()  # Normalizar também a unidade
+            itens_orcamento.append((int(numero_linha_planilha), descricao_orc, unidade_orc))
+
+        self.corpus = corpus
+        self.itens_orcamento = itens_orcamento
+        return corpus, itens_orcamento, gravar_indice
+
+    @staticmethod
+    def _valor_arredondado(valor) -> float:
+        """
+        Valor de material/mão de obra com 2 casas decimais. Texto é convertido
+        (ou vira NaN), como o pd.to_numeric(errors='coerce') aplicado à coluna.
+        """
+        if isinstance(valor, str):
+            valor = pd.to_numeric(valor, errors='coerce')
+        return float(np.round(float(valor), 2))
+
+    def _montar_corpus_referencia(self) -> CorpusReferencia:
+        """
+        Lê em streaming as quatro colunas mapeadas da planilha de referência e
+        monta o corpus das referências válidas, validando linha a linha (sem
+        DataFrame intermediário, para catálogos grandes não ocuparem memória
+        em dobro).
+        """
+        linhas = iterar_linhas(
+            self.parametros.referencia.caminho_planilha,
+            {
+                "descricao": self.parametros.referencia.coluna_descrição,
+                "material": self.parametros.referencia.coluna_material,
+                "mao_de_obra": self.parametros.referencia.coluna_mao_de_obra,
+                "unidade": self.parametros.referencia.coluna_unidade_medida
+            },
+            aba=self.parametros.referencia.aba
+        )
+
+        # Corpus de referências válidas, normalizado uma única vez (antes era refeito para cada item do orçamento)
+        corpus = CorpusReferencia(remover_acentos=self.parametros.pesquisa.IgnorarAcentos)
+        for numero_linha, (descricao, material, mao_de_obra, unidade) in linhas:
+            # Arredonda os valores de material e mão de obra (2 casas decimais); texto não numérico vira NaN
             try:
-                referencia.iloc[:, indiceDaColunaMaterialReferencia] = referencia.iloc[:, indiceDaColunaMaterialReferencia].round(2)
-                referencia.iloc[:, indiceDaColunaMaoDeObraReferencia] = referencia.iloc[:, indiceDaColunaMaoDeObraReferencia].round(2)
-            except Exception:
-                # Se as colunas não forem numéricas, tentar converter antes de arredondar
-                referencia.iloc[:, indiceDaColunaMaterialReferencia] = pd.to_numeric(referencia.iloc[:, indiceDaColunaMaterialReferencia], errors='coerce').round(2)
-                referencia.iloc[:, indiceDaColunaMaoDeObraReferencia] = pd.to_numeric(referencia.iloc[:, indiceDaColunaMaoDeObraReferencia], errors='coerce').round(2)
-
-            # Função que filtra as linhas do orçamento usando offset (compatibilidade com cabeçalhos)
-            offsetPandas = int(2)
-            linhasFiltradas = orcamento[
-                (orcamento.index + offsetPandas >= linha_inicio) &
-                (orcamento.index + offsetPandas <= linha_fim)
-            ]
-            
-            # IMPORTANTE: Guardar índices originais ANTES de reset_index para calcular linha correta
-            indices_originais = linhasFiltradas.index.tolist()
-            orcamento = linhasFiltradas.reset_index(drop=True)
-
-            resultados = []
-            for idx_novo, row_orc in orcamento.iterrows():
-                # Atualizar janela de progresso
-                if self.janela_progresso:
-                    self.janela_progresso.update()
-                
-                if not self.validadorDeLinhasOrcamento(row_orc, indiceDaColunaOrcamento, indiceDaColunaUnidadeMedidaReferencia):
-                    continue
-                descricao_orc = str(row_orc.iloc[indiceDaColunaOrcamento]).strip()  # Normalizar: remover espaços
-                unidade_orc = str(row_orc.iloc[indiceDaColunaUnidadeMedidaReferencia]).strip()  # Normalizar também a unidade
-                
-                # Calcular número de linha na planilha usando índice original
-                # indices_originais[idx_novo] é o índice no DataFrame original (antes do reset)
-                # +2 porque Pandas pula header (linha 0 Excel = linha 1 lógica, linha 1 Excel = linha 2 lógica)
-                numero_linha_planilha = indices_originais[idx_novo] + 2
+                valor_material = self._valor_arredondado(material)
+                valor_mao_de_obra = self._valor_arredondado(mao_de_obra)
+            except (ValueError, TypeError):
+                # Se não conseguir converter, a referência nunca gera correlação
+                print(f"[WARNING] Não conseguiu converter valores numéricos para referência: {str(descricao).strip()}")
+                continue
+
+            # Validação: descrição, material e mão de obra preenchidos (NaN descarta a linha)
+            if not self.validadorDeLinhasReferencia((descricao, valor_material, valor_mao_de_obra), 0, 1, 2):
+                continue
+
+            descricao_ref = str(descricao).strip()  # Normalizar também
+            unidade_ref = str(unidade).strip()
+            corpus.adicionar(descricao_ref, valor_material, valor_mao_de_obra, unidade_ref, numero_linha)
+        return corpus
+
+    def _progresso_da_execucao(self):
+        """Progresso recebido no construtor ou, só com PrazoSegundos, um progresso próprio com o prazo"""
+        prazo = self.parametros.pesquisa.PrazoSegundos
+        if self.progresso is None:
+            return Progresso(prazo_segundos=prazo) if prazo else None
+        if prazo and not self.progresso.prazo_segundos:
+            self.progresso.prazo_segundos = prazo
+        return self.progresso
+
+    def _correlacionar_com_progresso(self, progresso: Progresso, descricoes_orcamento: List[str], unidades_orcamento: List[str], corpus: CorpusReferencia, limite: int, taxa: float) -> list:
+        """
+        _correlacionar numa única chamada, com o progresso verificado e avançado
+        pelos motores a cada item. Cancelado ou com o prazo esgotado, devolve só
+        as correlações dos primeiros itens, já concluídos (lista mais curta).
+        """
+        inicio = progresso.concluidos
+        self._progresso_ativo = progresso
+        self._limite_progresso = inicio + len(descricoes_orcamento)
+        try:
+            correlacoes = self._correlacionar(descricoes_orcamento, unidades_orcamento, corpus, limite, taxa)
+        except OperacaoCancelada as e:
+            correlacoes = e.parciais or []
+        finally:
+            self._progresso_ativo = None
+        # Os motores contam só as descrições que calcularam (repetidas e já em cache não passam por eles)
+        progresso.avancar(inicio + len(correlacoes) - progresso.concluidos)
+        return correlacoes
+
+    def _ao_progredir(self, consultas: int = 1):
+        """
+        Chamado pelos motores a cada item (em paralelo, com a quantidade de itens
+        concluídos, 0 enquanto aguarda): mantém a janela responsiva, atende
+        cancelamento/prazo e avança o progresso.
+        """
+        if self.janela_progresso:
+            self.janela_progresso.update()
+        progresso = self._progresso_ativo
+        if progresso is not None:
+            progresso.verificar()
+            consultas = min(consultas, self._limite_progresso - progresso.concluidos)
+            if consultas > 0:
+                progresso.avancar(consultas)
+
+    def _correlacionar(self, descricoes_orcamento: List[str], unidades_orcamento: List[str], corpus: CorpusReferencia, limite: int, taxa: float) -> list:
+        """
+        Correlaciona os itens com o corpus inteiro ou, com FiltrarPorGrandeza,
+        cada item só com a partição do corpus da mesma grandeza física da unidade.
+        """
+        if not self.parametros.pesquisa.FiltrarPorGrandeza:
+            return self._correlacionar_no_corpus(descricoes_orcamento, corpus, limite, taxa)
+
+        conversor = ConversorMedidas()
+        particoes = corpus.particionar_por_grandeza()
+        indices_por_grandeza = {}
+        for indice, unidade in enumerate(unidades_orcamento):
+            indices_por_grandeza.setdefault(conversor.identificar_grandeza(unidade), []).append(indice)
+
+        # None = ainda não correlacionado (só sobra se a correlação for interrompida)
+        correlacoes = [[] for _ in descricoes_orcamento]
+        for grandeza, indices in indices_por_grandeza.items():
+            if grandeza in particoes:
+                for indice in indices:
+                    correlacoes[indice] = None
+
+        def preencher(indices: List[int], parciais: list, posicoes: List[int]):
+            for indice, encontrados in zip(indices, parciais):
+                # Posições da partição -> posições no corpus completo (mantém a ordem crescente)
+                correlacoes[indice] = [(posicoes[posicao], score) for posicao, score in encontrados]
+
+        for grandeza, indices in indices_por_grandeza.items():
+            if grandeza not in particoes:
+                continue  # Unidade não identificada ou sem referências da mesma grandeza
+            corpus_grandeza, posicoes = particoes[grandeza]
+            logger.debug(f"Grandeza {grandeza.value}: {len(indices)} itens x {len(corpus_grandeza)} referências")
+            try:
+                parciais = self._correlacionar_no_corpus(
+                    [descricoes_orcamento[i] for i in indices], corpus_grandeza, limite, taxa,
+                    corpus_completo=corpus, grandeza=grandeza
+                )
+            except OperacaoCancelada as e:
+                preencher(indices, e.parciais or [], posicoes)
+                # Seguem os primeiros itens, até o primeiro ainda não correlacionado
+                pendente = next((i for i, encontrados in enumerate(correlacoes) if encontrados is None), len(correlacoes))
+                e.parciais = correlacoes[:pendente]
+                raise
+            preencher(indices, parciais, posicoes)
+        return correlacoes
+
+    def _correlacionar_no_corpus(
+        self,
+        descricoes_orcamento: List[str],
+        corpus: CorpusReferencia,
+        limite: int,
+        taxa: float,
+        corpus_completo: CorpusReferencia = None,
+        grandeza=None
+    ) -> list:
+        """
+        Aplica atalho exato, memoização e o motor escolhido (sequencial ou em paralelo).
+        Com `grandeza`, `corpus` é a partição dessa grandeza de `corpus_completo`:
+        em paralelo, o pool é o do corpus completo e só a grandeza vai nas tarefas.
+        """
+        # Motor de similaridade escolhido nos parâmetros ("sequencematcher" é o modo de referência)
+        nome_motor = self.parametros.pesquisa.MotorSimilaridade
+        processos = self.parametros.pesquisa.ProcessosParalelos
+        logger.debug(f"Motor de similaridade: {nome_motor} | processos: {processos} | limite: {limite} | taxa: {taxa}")
+        opcoes_motor = self._opcoes_motor(nome_motor)
+        ao_progredir = self._ao_progredir if self.janela_progresso or self._progresso_ativo is not None else None
+
+        def correlacionar(descricoes: List[str]):
+            if processos == 1:
+                motor = obter_motor(nome_motor)
+                return motor(descricoes, corpus, taxa, ao_progredir=ao_progredir, limite=limite, **opcoes_motor)
+            return correlacionar_em_paralelo(
+                nome_motor, descricoes, corpus if grandeza is None else corpus_completo, taxa,
+                processos=processos,
+                ao_progredir=ao_progredir,
+                limite=limite,
+                opcoes_motor=opcoes_motor,
+                particao=grandeza
+            )
+
+        # Atalho: descrições idênticas a uma referência já entram com 100%
+        def correlacionar_com_atalho(descricoes: List[str]):
+            return correlacionar_com_atalho_exato(
+                descricoes, corpus, taxa, correlacionar,
+                pular_fuzzy_quando_exato=self.parametros.pesquisa.PularFuzzyQuandoExato,
+                limite=limite
+            )
+
+        # Descrições repetidas (no orçamento ou já vistas na sessão com o mesmo corpus) não são recalculadas
+        versao = (
+            corpus.assinatura(),
+            nome_motor,
+            taxa,
+            limite,
+            self.parametros.pesquisa.PularFuzzyQuandoExato,
+            tuple(sorted(opcoes_motor.items()))
+        )
+        return _cache_correlacoes.correlacionar(versao, descricoes_orcamento, correlacionar_com_atalho)
+
+    def _opcoes_motor(self, nome_motor: str) -> Dict:
+        """Argumentos específicos do motor escolhido (pontuador do "rapidfuzz"/"rerank", bandas/linhas do "minhash")"""
+        opcoes = {}
+        if nome_motor in ("rapidfuzz", "rerank") and self.parametros.pesquisa.Pontuador:
+            opcoes["pontuador"] = self.parametros.pesquisa.Pontuador
+        if nome_motor == "rerank":
+            opcoes["candidatos"] = self.parametros.pesquisa.CandidatosRerank
+        if nome_motor in ("sequencematcher", "rerank", "minhash"):
+            # Guarda de custo para descrições longas (só motores com score do SequenceMatcher)
+            if self.parametros.pesquisa.ComprimentoMaximoComparado:
+                opcoes["comprimento_maximo"] = self.parametros.pesquisa.ComprimentoMaximoComparado
+            if self.parametros.pesquisa.TempoMaximoPar:
+                opcoes["tempo_maximo_par"] = self.parametros.pesquisa.TempoMaximoPar
+        if nome_motor != "minhash":
+            return opcoes
+        from motor_minhash import probabilidade_colisao
+        bandas = self.parametros.pesquisa.BandasLSH
+        linhas = self.parametros.pesquisa.LinhasLSH
+        recall = ", ".join(f"J={j}: {probabilidade_colisao(j, bandas, linhas):.0%}" for j in (0.3, 0.5, 0.7))
+        logger.debug(f"LSH bandas={bandas} linhas={linhas} | recall estimado por Jaccard dos trigramas: {recall}")
+        return {**opcoes, "bandas": bandas, "linhas": linhas}
+
+    def _registrar_recall_lsh(self, corpus: CorpusReferencia, descricoes_orcamento: List[str], taxa: float):
+        """
+        Mede (estimar_recall) e registra no log o recall do LSH em uma amostra
+        de AMOSTRA_RECALL_LSH descrições distintas, espalhadas pelo orçamento.
+        A amostra passa pelo SequenceMatcher em toda a janela de comprimento, por
+        isso é pequena e a medição só roda com `MedirRecallLSH`.
+        """
+        distintas = list(dict.fromkeys(descricoes_orcamento))
+        if not AMOSTRA_RECALL_LSH or not distintas:
+            return
+        from motor_minhash import estimar_recall
+        amostra = distintas[::max(1, len(distintas) // AMOSTRA_RECALL_LSH)][:AMOSTRA_RECALL_LSH]
+        bandas = self.parametros.pesquisa.BandasLSH
+        linhas = self.parametros.pesquisa.LinhasLSH
+        recall = estimar_recall(amostra, corpus, taxa, bandas=bandas, linhas=linhas)
+        if recall is None:
+            logger.info(f"LSH bandas={bandas} linhas={linhas} | recall não medido: amostra de {len(amostra)} descrições sem correlações")
+        else:
+            logger.info(f"LSH bandas={bandas} linhas={linhas} | recall medido em {len(amostra)} descrições: {recall:.0%}")
+
+    def _registrar_descricoes_reduzidas(self, corpus: CorpusReferencia, itens_orcamento: list):
+        """
+        Guarda em `descricoes_reduzidas` (e avisa no log) as descrições do
+        orçamento e da referência que precisaram da guarda de custo. As reduzidas
+        pela guarda de tempo só são vistas aqui sem processos paralelos.
+        """
+        comprimento = self.parametros.pesquisa.ComprimentoMaximoComparado
+        if not comprimento and not self.parametros.pesquisa.TempoMaximoPar:
+            self.descricoes_reduzidas = []
+            return
+
+        # Corpus completo e, com FiltrarPorGrandeza, as partições (posições convertidas para o corpus completo)
+        corpora = [(corpus, None)]
+        if self.parametros.pesquisa.FiltrarPorGrandeza:
+            corpora += list(corpus.particionar_por_grandeza().values())
+        consultas = set().union(*(parte.consultas_reduzidas for parte, _ in corpora))
+        posicoes = set()
+        for parte, posicoes_no_corpus in corpora:
+            posicoes.update(p if posicoes_no_corpus is None else posicoes_no_corpus[p] for p in parte.posicoes_reduzidas)
+        if comprimento:
+            posicoes.update(p for p, descricao in enumerate(corpus.descricoes_normalizadas) if len(descricao) > comprimento)
+
+        reduzidas = [
+            descricao for _, descricao, _ in itens_orcamento
+            if corpus.normalizar(descricao) in consultas or (comprimento and len(corpus.normalizar(descricao)) > comprimento)
+        ]
+        reduzidas += [corpus.descricoes[posicao] for posicao in sorted(posicoes)]
+        self.descricoes_reduzidas = list(dict.fromkeys(reduzidas))
+        if self.descricoes_reduzidas:
+            logger.warning(
+                f"{len(self.descricoes_reduzidas)} descrições comparadas pela versão reduzida (guarda de custo): "
+                + "; ".join(descricao[:60] for descricao in self.descricoes_reduzidas[:5])
+            )
+
+    @staticmethod
+    def _montar_resultados(itens_orcamento: list, correlacoes: list, corpus: CorpusReferencia) -> List[Dict]:
+        """Converte (posição no corpus, score) nos dicts de resultado usados pelas telas"""
+        resultados = []
+        for (numero_linha_planilha, descricao_orc, unidade_orc), encontrados in zip(itens_orcamento, correlacoes):
+            for posicao, score in encontrados:
+                descricao_ref = corpus.descricoes[posicao]
+                valor_material = float(corpus.valores_material[posicao])
+                valor_mao_de_obra = float(corpus.valores_mao_de_obra[posicao])
+                valor_total = valor_material + valor_mao_de_obra
                 
-                for idx_ref, row_ref in referencia.iterrows():
-                    if self.validadorDeLinhasReferencia(
-                        row_ref, 
-                        indiceDaColunaReferencia,
-                        indiceDaColunaMaterialReferencia,
-                        indiceDaColunaMaoDeObraReferencia
-                    ):
-                        descricao_ref = str(row_ref.iloc[indiceDaColunaReferencia]).strip()  # Normalizar também
-                        score = self.similaridade(descricao_orc, descricao_ref)
-                        
-                        if score > self.parametros.pesquisa.TaxaSimilaridade:
-                            # TRATAMENTO DE ERRO: Valores podem estar como strings ou NaN
-                            try:
-                                valor_material = float(row_ref.iloc[indiceDaColunaMaterialReferencia])
-                                valor_mao_de_obra = float(row_ref.iloc[indiceDaColunaMaoDeObraReferencia])
-                            except (ValueError, TypeError):
-                                # Se não conseguir converter, pula esta correlação
-                                print(f"[WARNING] Não conseguiu converter valores numéricos para referência: {descricao_ref}")
-                                continue
-                            
-                            # Validação: valores não podem ser NaN
-                            if pd.isna(valor_material) or pd.isna(valor_mao_de_obra):
-                                print(f"[WARNING] Valores NaN encontrados para referência: {descricao_ref}")
-                                continue
-                            
-                            valor_total = valor_material + valor_mao_de_obra
-                            
-                            resultados.append({
-                                "item": descricao_orc,
-                                "numero_linha": numero_linha_planilha,
-                                "unidade": unidade_orc,
-                                "referencia": descricao_ref,
-                                "similaridade": score * 100,
-                                "valor_material": valor_material,
-                                "valor_mao_de_obra": valor_mao_de_obra,
-                                "valor_total": valor_total
-                            })
-            
-            return resultados
-        
-        except Exception as e:
-            raise e
+                resultados.append({
+                    "item": descricao_orc,
+                    "numero_linha": numero_linha_planilha,
+                    "unidade": unidade_orc,
+                    "referencia": descricao_ref,
+                    "similaridade": score * 100,
+                    "valor_material": valor_material,
+                    "valor_mao_de_obra": valor_mao_de_obra,
+                    "valor_total": valor_total
+                })
+        return resultados
+
+    def buscar_mais_referencias(self, item: str, limite: int) -> List[Dict]:
+        """
+        Refaz a correlação de um item do orçamento com um limite maior de
+        candidatos ("mostrar mais"), reaproveitando o corpus do último processamento.
+        """
+        if self.corpus is None:
+            raise ValueError("Execute processar_dados() antes de buscar mais referências")
+        itens = [item_orc for item_orc in self.itens_orcamento if item_orc[1] == item.strip()]
+        descricoes = [self.corpus.normalizar(descricao) for _, descricao, _ in itens]
+        unidades = [unidade for _, _, unidade in itens]
+        correlacoes = self._correlacionar(descricoes, unidades, self.corpus, limite, self.parametros.pesquisa.TaxaSimilaridade)
+        return self._montar_resultados(itens, correlacoes, self.corpus)
+
+    def refiltrar_por_taxa(self, taxa: float) -> List[Dict]:
+        """
+        Aplica uma nova taxa de similaridade ao último processamento. A partir do
+        piso é só uma máscara sobre os scores em memória; abaixo dele, recalcula
+        com o corpus já carregado (sem reler as planilhas) a partir do piso da
+        nova taxa (ver `_piso`).
+        """
+        if self.corpus is None or self.scores is None:
+            raise ValueError("Execute processar_dados() antes de alterar a taxa")
+        if taxa < self.scores.piso:
+            descricoes = [self.corpus.normalizar(descricao) for _, descricao, _ in self.itens_orcamento]
+            unidades = [unidade for _, _, unidade in self.itens_orcamento]
+            piso = self._piso(taxa)
+            correlacoes = self._correlacionar(descricoes, unidades, self.corpus, self.parametros.pesquisa.MaximoCandidatos, piso)
+            self.scores = ScoresCompactos(correlacoes, piso)
+        self.parametros.pesquisa.TaxaSimilaridade = taxa
+        return self._montar_resultados(self.itens_orcamento, self.scores.filtrar(taxa), self.corpus)
     
     @staticmethod
     def agrupar_correlacoes_por_item(resultados: List[Dict]) -> Dict[str, List[Dict]]:
@@ -232,7 +654,7 @@ def criar_interface(root, parametros: ParametrosProcessamento):
         # Criar janela de notificação (NÃO-MODAL)
         janela_prog = tk.Toplevel(root)
         janela_prog.title("Carregando Dados")
-        janela_prog.geometry("300x100")
+        janela_prog.geometry("320x150")
         janela_prog.resizable(False, False)
         
         # Centralizar na tela
@@ -243,20 +665,34 @@ def criar_interface(root, parametros: ParametrosProcessamento):
         janela_prog.geometry(f"+{x}+{y}")
         
         # Adicionar label e progressbar
-        tk.Label(janela_prog, text="Processando…", font=("Segoe UI", 11, "bold")).pack(pady=10)
+        tk.Label(janela_prog, text="Processando…", font=("Segoe UI", 11, "bold")).pack(pady=(10, 2))
+        texto_progresso = tk.StringVar(value="Lendo planilhas…")
+        tk.Label(janela_prog, textvariable=texto_progresso, font=("Segoe UI", 9)).pack()
         progress = ttk.Progressbar(janela_prog, mode="indeterminate", length=250)
         progress.pack(pady=5, padx=20)
         progress.start()
-        
-        # Se fechar a janela de progresso, fechar a tela inteira
-        def ao_fechar_janela():
-            logger.warning("Processamento interrompido pelo usuário")
-            root.destroy()
-        
-        janela_prog.protocol("WM_DELETE_WINDOW", ao_fechar_janela)
+
+        # Linhas concluídas e tempo restante; a barra vira determinada quando o total é conhecido
+        def ao_atualizar_progresso(andamento: Progresso):
+            if andamento.total and str(progress["mode"]) != "determinate":
+                progress.stop()
+                progress.configure(mode="determinate", maximum=andamento.total)
+            progress["value"] = andamento.concluidos
+            texto_progresso.set(andamento.descricao())
+
+        progresso = Progresso(ao_atualizar=ao_atualizar_progresso, prazo_segundos=parametros.pesquisa.PrazoSegundos)
+
+        # Cancelar (botão ou fechar a janela) interrompe o processamento e mantém as linhas já correlacionadas
+        def cancelar_processamento():
+            logger.warning("Processamento cancelado pelo usuário")
+            texto_progresso.set("Cancelando…")
+            progresso.cancelar()
+
+        tk.Button(janela_prog, text="Cancelar", command=cancelar_processamento).pack(pady=(0, 5))
+        janela_prog.protocol("WM_DELETE_WINDOW", cancelar_processamento)
         
         # Processar mantendo responsividade visual
-        processador = ProcessamentoBase(parametros, janela_progresso=janela_prog)  # Atualizar com janela_prog
+        processador = ProcessamentoBase(parametros, janela_progresso=janela_prog, progresso=progresso)  # Atualizar com janela_prog
         dados = processador.processar_dados()
         
         # Fechar janela de progresso (se ainda estiver aberta)
@@ -265,6 +701,15 @@ def criar_interface(root, parametros: ParametrosProcessamento):
             janela_prog.destroy()
         except:
             pass  # Janela já foi fechada pelo usuário
+        processador.janela_progresso = None  # Próximas buscas ("mostrar mais") não usam a janela destruída
+        processador.progresso = None
+
+        if progresso.interrompido:
+            messagebox.showinfo(
+                "Resultado parcial",
+                f"Processamento {progresso.interrompido}: exibindo as {len(processador.itens_orcamento)} "
+                f"primeiras linhas do orçamento já correlacionadas."
+            )
         
         logger.debug(f"2. Dados retornados: {len(dados)} itens")
         logger.debug(f"3. Amostra de dados: {dados[:2] if dados else 'VAZIO'}")
@@ -368,6 +813,24 @@ def criar_interface(root, parametros: ParametrosProcessamento):
     entrada_pesquisa = tk.Entry(frame_pesquisa, font=("Segoe UI", 10), width=50)
     entrada_pesquisa.pack(anchor="w", pady=(5, 0))
 
+    # Taxa aplicada sobre os scores já calculados (sem reprocessar as planilhas)
+    frame_taxa = tk.Frame(frame_pesquisa, bg="white")
+    frame_taxa.pack(anchor="w", pady=(8, 0))
+
+    tk.Label(
+        frame_taxa,
+        text="Taxa de similaridade (0 a 1):",
+        font=("Segoe UI", 9),
+        bg="white"
+    ).pack(side="left")
+
+    entrada_taxa = tk.Entry(frame_taxa, font=("Segoe UI", 10), width=8)
+    entrada_taxa.insert(0, str(parametros.pesquisa.TaxaSimilaridade))
+    entrada_taxa.pack(side="left", padx=5)
+
+    btn_aplicar_taxa = ttk.Button(frame_taxa, text="Aplicar Taxa")
+    btn_aplicar_taxa.pack(side="left")
+
     # ===== FRAME CORPO (Contém as 2 grids com layout grid) =====
     frame_corpo = tk.Frame(root, bg="#f5f5f5")
     frame_corpo.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
@@ -1079,11 +1542,107 @@ def criar_interface(root, parametros: ParametrosProcessamento):
         logger.debug(f"TelaCheckin respondida | confirmado={confirmado}")
 
 
+    limite_por_item = {}  # Limite atual de candidatos por item após "Mostrar mais"
+
+    def mostrar_mais():
+        """Dobra o limite de referências do item selecionado e atualiza a grid inferior"""
+        nonlocal selecoes
+        item_nome = item_selecionado["nome"]
+        if not item_nome:
+            return
+
+        limite_atual = limite_por_item.get(item_nome, parametros.pesquisa.MaximoCandidatos)
+        if not limite_atual:
+            messagebox.showinfo("Mostrar Mais", "Todas as referências acima da taxa já estão sendo exibidas.")
+            return
+
+        try:
+            novo_limite = limite_atual * 2
+            novas_referencias = processador.buscar_mais_referencias(item_nome, novo_limite)
+            limite_por_item[item_nome] = novo_limite
+            logger.debug(f"Mostrar mais | item={item_nome} | limite={novo_limite} | referências={len(novas_referencias)}")
+
+            if len(novas_referencias) <= len(dados_agrupados.get(item_nome, [])):
+                messagebox.showinfo("Mostrar Mais", "Não há mais referências acima da taxa de similaridade.")
+                return
+
+            dados_agrupados[item_nome] = novas_referencias
+            selecoes = atualizar_grid_inferior(
+                item_nome,
+                selecoes,
+                dados_agrupados,
+                tree_ref,
+                itens_respondidos,
+                mapa_consolidado
+            )
+        except Exception as e:
+            logger.error(f"Erro em mostrar_mais: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def aplicar_taxa(event=None):
+        """Reaplica a taxa de similaridade sobre os scores em memória e atualiza as grids"""
+        nonlocal selecoes
+        try:
+            taxa = float(entrada_taxa.get().replace(",", "."))
+        except ValueError:
+            taxa = -1
+        if not 0 <= taxa <= 1:
+            messagebox.showerror("Taxa de Similaridade", "Informe uma taxa entre 0 e 1.")
+            return
+
+        try:
+            resultados = processador.refiltrar_por_taxa(taxa)
+            dados_agrupados.clear()
+            dados_agrupados.update(processador.agrupar_correlacoes_por_item(resultados))
+            limite_por_item.clear()
+            logger.debug(f"Taxa aplicada | taxa={taxa} | itens={len(dados_agrupados)}")
+
+            dados_orcamento[:] = [
+                {"item": item, "unidade": opcoes[0].get("unidade", ""), "qtd": len(opcoes)}
+                for item, opcoes in dados_agrupados.items() if opcoes
+            ]
+            filtrar_itens()
+
+            # Mantém o item selecionado se ele ainda tem referências acima da taxa
+            item_nome = item_selecionado["nome"]
+            if item_nome not in dados_agrupados:
+                item_nome = dados_orcamento[0]["item"] if dados_orcamento else None
+                item_selecionado["nome"] = item_nome
+
+            if item_nome is None:
+                for item in tree_ref.get_children():
+                    tree_ref.delete(item)
+                return
+
+            for item_id in tree_orc.get_children():
+                if tree_orc.item(item_id)["values"][0] == item_nome:
+                    tree_orc.selection_set(item_id)
+                    tree_orc.see(item_id)
+                    break
+            selecoes = atualizar_grid_inferior(
+                item_nome,
+                selecoes,
+                dados_agrupados,
+                tree_ref,
+                itens_respondidos,
+                mapa_consolidado
+            )
+        except Exception as e:
+            logger.error(f"Erro em aplicar_taxa: {e}")
+            import traceback
+            traceback.print_exc()
+
+    btn_aplicar_taxa.configure(command=aplicar_taxa)
+    entrada_taxa.bind("<Return>", aplicar_taxa)
+
     btn_finalizar = ttk.Button(frame_btns, text="Finalizar", command=finalizar)
     btn_prosseguir = ttk.Button(frame_btns, text="Prosseguir", command=prosseguir)
+    btn_mostrar_mais = ttk.Button(frame_btns, text="Mostrar Mais", command=mostrar_mais)
 
     btn_finalizar.pack(side="left", padx=5)
     btn_prosseguir.pack(side="right", padx=5)
+    btn_mostrar_mais.pack(side="right", padx=5)
 
 class TelaProcessamento:
     def __init__(self, root, parametros: ParametrosProcessamento):
@@ -0,0 +1,107 @@
+"""
+Progresso, cancelamento e prazo das operações longas.
+
+Um único objeto `Progresso` é passado para processamento, Correlacionador,
+DataModel e AtualizadorPlanilha. A operação informa o total e avança a cada
+linha (ou bloco); quem chamou acompanha linhas concluídas e ETA, pode pedir o
+cancelamento a qualquer momento e definir um prazo. O cancelamento é
+cooperativo: a operação para na próxima verificação e devolve o que já
+concluiu (resultado parcial), registrando o motivo em `interrompido`.
+"""
+
+import time
+from typing import Callable, Optional
+
+
+class OperacaoCancelada(Exception):
+    """
+    Levantada por `Progresso.verificar()` quando a operação deve parar.
+    `parciais`: o que já foi concluído, quando quem a propaga sabe (ex.: as
+    correlações dos primeiros itens, anexadas pelos motores de correlação).
+    """
+
+    def __init__(self, *args, parciais: Optional[list] = None):
+        super().__init__(*args)
+        self.parciais = parciais
+
+
+class Progresso:
+    CANCELADO = "cancelado"
+    PRAZO_ESGOTADO = "prazo esgotado"
+
+    def __init__(
+        self,
+        total: int = 0,
+        ao_atualizar: Optional[Callable[["Progresso"], None]] = None,
+        prazo_segundos: float = 0
+    ):
+        """
+        Args:
+            total: Quantidade de linhas (ou itens) da operação, se já conhecida
+            ao_atualizar: Chamado a cada avanço (ex.: atualizar a janela de progresso)
+            prazo_segundos: Tempo máximo da operação (0 = sem prazo)
+        """
+        self.total = total
+        self.concluidos = 0
+        self.ao_atualizar = ao_atualizar
+        self.prazo_segundos = prazo_segundos
+        self.inicio = time.monotonic()  # O prazo conta desde a criação
+        self.inicio_contagem = self.inicio  # O ETA conta desde iniciar()
+        self.interrompido: Optional[str] = None
+        self._cancelado = False
+
+    def iniciar(self, total: int):
+        """Reinicia a contagem de linhas (ex.: depois de ler as planilhas), mantendo o prazo"""
+        self.total = total
+        self.concluidos = 0
+        self.inicio_contagem = time.monotonic()
+        self._notificar()
+
+    def avancar(self, quantidade: int = 1):
+        self.concluidos += quantidade
+        self._notificar()
+
+    def cancelar(self):
+        """Pede o cancelamento; a operação para na próxima verificação"""
+        self._cancelado = True
+
+    @property
+    def decorrido(self) -> float:
+        return time.monotonic() - self.inicio
+
+    @property
+    def deve_parar(self) -> bool:
+        """True (e registra o motivo) se a operação foi cancelada ou o prazo acabou"""
+        if self._cancelado:
+            self.interrompido = self.CANCELADO
+        elif self.prazo_segundos and self.decorrido > self.prazo_segundos:
+            self.interrompido = self.PRAZO_ESGOTADO
+        return self.interrompido is not None
+
+    def verificar(self):
+        """Levanta OperacaoCancelada se a operação deve parar (para uso dentro de laços)"""
+        if self.deve_parar:
+            raise OperacaoCancelada(self.interrompido)
+
+    @property
+    def eta_segundos(self) -> Optional[float]:
+        """Tempo restante estimado pelo ritmo até aqui (None sem dados suficientes)"""
+        if not self.total or not self.concluidos:
+            return None
+        ritmo = (time.monotonic() - self.inicio_contagem) / self.concluidos
+        return ritmo * max(self.total - self.concluidos, 0)
+
+    def descricao(self) -> str:
+        """Texto curto para a interface, ex.: '120/500 linhas (24%) · restam ~0:35'"""
+        if not self.total:
+            return f"{self.concluidos} linhas"
+        texto = f"{self.concluidos}/{self.total} linhas ({self.concluidos / self.total:.0%})"
+        eta = self.eta_segundos
+        if eta is not None:
+            minutos, segundos = divmod(int(eta), 60)
+            texto += f" · restam ~{minutos}:{segundos:02d}"
+        return texto
+
+    def _notificar(self):
+        if self.ao_atualizar:
+            self.ao_atualizar(self)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+VALIDAÇÃO DO CACHE DE PLANILHAS - leitura fria x leitura do cache
+
+Uso:
+    python validacao_cache_planilhas.py
+
+Monta uma planilha com cabeçalho sobre colunas de datas, horas e valores
+misturados (texto, número, data, vazio), lê com `leitura_planilhas.ler_tabela`
+sem cache, com o cache vazio (fria, grava a entrada) e de novo só do cache em
+disco (sessão limpa), e confere que as três leituras têm os mesmos valores,
+os mesmos dtypes e o mesmo tipo Python em cada célula. Repete para a aba
+inteira e para recortes de colunas e de linhas.
+
+Termina com código 1 se alguma comparação falhar; sem pyarrow, não há o que
+conferir.
+"""
+
+import sys
+import tempfile
+from datetime import datetime, time
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+import cache_planilhas
+import leitura_planilhas
+
+ABA = "Planilha de Custo"
+
+LINHAS = [
+    ("Item", "Data", "Hora", "Misto"),
+    (1, datetime(2024, 1, 5), time(8, 30), "texto"),
+    (2, datetime(2024, 2, 6, 13, 45, 10), time(9, 0), datetime(2023, 3, 3)),
+    (3, None, None, 5),
+    (4, datetime(2024, 3, 7), time(10, 15, 5), 2.5),
+    (5, datetime(2024, 4, 8), time(23, 59, 59), time(7, 0)),
+]
+
+# (colunas, pular_linhas, linhas) lidos por ler_tabela
+RECORTES = [
+    (None, 0, None),
+    ({1, 3}, 0, None),
+    (None, 1, None),
+    ({1, 2, 3}, 2, 3),
+]
+
+
+def criar_planilha(pasta: Path) -> str:
+    livro = Workbook()
+    planilha = livro.active
+    planilha.title = ABA
+    for linha in LINHAS:
+        planilha.append(linha)
+    caminho = str(pasta / "datas.xlsx")
+    livro.save(caminho)
+    return caminho
+
+
+def tipos_das_celulas(dados: pd.DataFrame) -> list:
+    return [[type(valor).__name__ for valor in dados[coluna]] for coluna in dados.columns]
+
+
+def diferencas(esperado: pd.DataFrame, obtido: pd.DataFrame) -> list:
+    motivos = []
+    if not esperado.equals(obtido):
+        motivos.append("valores")
+    if list(esperado.dtypes) != list(obtido.dtypes):
+        motivos.append(f"dtypes {list(esperado.dtypes)} != {list(obtido.dtypes)}")
+    if tipos_das_celulas(esperado) != tipos_das_celulas(obtido):
+        motivos.append(f"tipos {tipos_das_celulas(esperado)} != {tipos_das_celulas(obtido)}")
+    return motivos
+
+
+def main() -> int:
+    if not cache_planilhas.disponivel():
+        print("pyarrow não instalado: leitura sem cache, nada a conferir")
+        return 0
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = criar_planilha(Path(pasta))
+        for colunas, pular_linhas, linhas in RECORTES:
+            opcoes = dict(aba=ABA, colunas=colunas, pular_linhas=pular_linhas, linhas=linhas, backend="openpyxl")
+            sem_cache = leitura_planilhas.ler_tabela(caminho, usar_cache=False, **opcoes)
+            leitura_planilhas.sessao.limpar()
+            fria = leitura_planilhas.ler_tabela(caminho, **opcoes)
+            leitura_planilhas.sessao.limpar()
+            do_cache = leitura_planilhas.ler_tabela(caminho, **opcoes)
+
+            motivos = [f"fria: {motivo}" for motivo in diferencas(sem_cache, fria)]
+            motivos += [f"cache: {motivo}" for motivo in diferencas(sem_cache, do_cache)]
+            recorte = f"colunas={sorted(colunas) if colunas else 'todas'} pular={pular_linhas} linhas={linhas}"
+            print(f"{recorte:<40} | {'IGUAL' if not motivos else 'DIFERENTE: ' + '; '.join(motivos)}")
+            falhas += bool(motivos)
+        leitura_planilhas.sessao.limpar()
+
+    print("OK" if not falhas else f"{falhas} comparações falharam")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+VALIDAÇÃO DO DATAMODEL - matriz de scores x extractOne por referência
+
+Uso:
+    python validacao_data_model.py
+
+Carrega as planilhas de exemplo pelo DataModel (como a tela principal) e roda
+`mesclar_planilhas` nos dois modos:
+
+* Padrão (streaming): as correspondências têm de ser as mesmas do laço
+  original, um `process.extractOne` (fuzz.WRatio, corte match_threshold) por
+  linha da referência.
+* Um para um: nenhuma referência nem linha do orçamento se repete, e os pares
+  são os da atribuição gulosa (maior score primeiro) sobre todos os pares
+  acima do corte, calculada aqui sem a MatrizScores.
+
+Termina com código 1 se alguma comparação falhar.
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from data_model import DataModel
+
+BASE_DIR = Path(__file__).parent
+CAMINHO_REFERENCIA = str(BASE_DIR / "PlanilhaReferencia.xlsx")
+CAMINHO_ORCAMENTO = str(BASE_DIR / "PlanilhaOrçamento.xlsx")
+
+
+def carregar_modelo() -> DataModel:
+    modelo = DataModel()
+    modelo.carregar_planilha(CAMINHO_ORCAMENTO, "orcamento")
+    modelo.carregar_planilha(CAMINHO_REFERENCIA, "referencia")
+    return modelo
+
+
+def descricoes(modelo: DataModel):
+    descricoes_orc = modelo.df_orcamento[1].iloc[1:].astype(str).dropna().tolist()
+    descricoes_ref = modelo.df_referencia[1].iloc[1:].astype(str).dropna().tolist()
+    validas = [idx for idx, descricao in enumerate(descricoes_ref) if descricao and descricao.strip() != 'nan']
+    return descricoes_orc, descricoes_ref, validas
+
+
+def linha(modelo: DataModel, idx_ref: int, idx_orc: int, pontuacao: float) -> tuple:
+    """As colunas de correspondencias_df que identificam o par"""
+    materiais = modelo.df_referencia.iloc[idx_ref + 1][4]
+    return (str(modelo.df_orcamento.iloc[idx_orc + 1][1]), round(float(pontuacao), 6),
+            float(materiais) if pd.notna(materiais) else 0.0)
+
+
+def esperado_extract_one(modelo: DataModel) -> list:
+    descricoes_orc, descricoes_ref, validas = descricoes(modelo)
+    pares = []
+    for idx_ref in validas:
+        melhor = process.extractOne(
+            descricoes_ref[idx_ref], descricoes_orc, scorer=fuzz.WRatio, score_cutoff=modelo.match_threshold
+        )
+        if melhor:
+            pares.append(linha(modelo, idx_ref, melhor[2], melhor[1]))
+    return pares
+
+
+def esperado_um_para_um(modelo: DataModel) -> list:
+    descricoes_orc, descricoes_ref, validas = descricoes(modelo)
+    candidatos = []
+    for idx_ref in validas:
+        for idx_orc, descricao_orc in enumerate(descricoes_orc):
+            score = fuzz.WRatio(descricoes_ref[idx_ref], descricao_orc, score_cutoff=modelo.match_threshold)
+            if score >= modelo.match_threshold:
+                candidatos.append((-score, idx_ref, idx_orc))
+
+    refs_usadas, orcs_usados, pares = set(), set(), []
+    for score_negativo, idx_ref, idx_orc in sorted(candidatos):
+        if idx_ref not in refs_usadas and idx_orc not in orcs_usados:
+            refs_usadas.add(idx_ref)
+            orcs_usados.add(idx_orc)
+            pares.append((idx_ref, idx_orc, -score_negativo))
+    return [linha(modelo, *par) for par in sorted(pares)]
+
+
+def obtido(modelo: DataModel, um_para_um: bool) -> list:
+    modelo.mesclar_planilhas(um_para_um=um_para_um)
+    resultado: pd.DataFrame = modelo.correspondencias_df
+    return [
+        (descricao, round(pontuacao, 6), materiais)
+        for descricao, pontuacao, materiais in zip(
+            resultado["Descricao_Orcamento"], resultado["Similaridade_Pontuacao"], resultado["Materiais_Referencia"]
+        )
+    ]
+
+
+def main() -> int:
+    modelo = carregar_modelo()
+    falhas = 0
+    for nome, um_para_um, esperado in (
+        ("streaming", False, esperado_extract_one(modelo)),
+        ("um para um", True, esperado_um_para_um(modelo)),
+    ):
+        resultado = obtido(modelo, um_para_um)
+        igual = resultado == esperado
+        print(f"{nome:<10} | {len(esperado):5d} correspondências | {'IGUAL' if igual else 'DIFERENTE'}")
+        falhas += not igual
+
+    print("OK" if not falhas else f"{falhas} comparações falharam")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
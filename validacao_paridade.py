@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+VALIDAÇÃO DE PARIDADE - motor padrão x laço simples com SequenceMatcher
+
+Uso:
+    python validacao_paridade.py
+
+Lê as planilhas de exemplo como o processamento original (pd.read_excel da aba
+inteira, todas as referências comparadas com cada item) e compara o resultado
+com ProcessamentoBase.processar_dados no motor padrão ("sequencematcher"):
+
+* Sem limite de candidatos (MaximoCandidatos=0): os resultados têm de ser
+  idênticos (mesmas linhas, referências, scores e ordem). Cobre os cortes do
+  índice de trigramas, do comprimento e o atalho de descrições exatas.
+* Com limite (o padrão e um pequeno, que corta de fato nas planilhas de
+  exemplo): cada item traz os `MaximoCandidatos` melhores do laço simples
+  (empates no corte podem trazer qualquer um dos empatados).
+
+Termina com código 1 se alguma comparação falhar.
+"""
+
+import logging
+import sys
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import pandas as pd
+
+from parametrosPlanilha import ParametrosPlanilhas
+from OperacaoCorrelacao import OperacaoCorrelacao
+from ParametrosProcessamento import ParametrosProcessamento
+import processamento
+from processamento import ProcessamentoBase
+
+BASE_DIR = Path(__file__).parent
+CAMINHO_REFERENCIA = str(BASE_DIR / "PlanilhaReferencia.xlsx")
+CAMINHO_ORCAMENTO = str(BASE_DIR / "PlanilhaOrçamento.xlsx")
+ABA = "Planilha de Custo"
+
+# Intervalo do orçamento (linhas do Excel) e taxas comparadas
+LINHAS = (2, 10000)
+TAXAS = (0.5, 0.7, 0.9)
+
+# Limite de candidatos pequeno, além do padrão de OperacaoCorrelacao
+LIMITE_PEQUENO = 2
+
+
+def parametros(taxa: float, maximo_candidatos: int) -> ParametrosProcessamento:
+    planilha = lambda caminho: ParametrosPlanilhas(caminho, ABA, "B", "E", "F", "C")
+    return ParametrosProcessamento(
+        referencia=planilha(CAMINHO_REFERENCIA),
+        orcamento=planilha(CAMINHO_ORCAMENTO),
+        pesquisa=OperacaoCorrelacao(
+            ComecoPesquisa=LINHAS[0],
+            TerminoPesquisa=LINHAS[1],
+            TaxaSimilaridade=taxa,
+            MaximoCandidatos=maximo_candidatos,
+            UsarIndiceEmDisco=False
+        )
+    )
+
+
+def correlacionar_laco_simples(taxa: float) -> list:
+    """(linha do orçamento, referência, score) de todos os pares acima da taxa, como no processamento original"""
+    referencia = pd.read_excel(CAMINHO_REFERENCIA, sheet_name=ABA)
+    orcamento = pd.read_excel(CAMINHO_ORCAMENTO, sheet_name=ABA)
+    material = pd.to_numeric(referencia.iloc[:, 4], errors="coerce").round(2)
+    mao_de_obra = pd.to_numeric(referencia.iloc[:, 5], errors="coerce").round(2)
+
+    referencias = [
+        str(descricao).strip()
+        for descricao, valor_material, valor_mao_de_obra in zip(referencia.iloc[:, 1], material, mao_de_obra)
+        if ProcessamentoBase.validadorDeLinhasReferencia((descricao, valor_material, valor_mao_de_obra), 0, 1, 2)
+    ]
+
+    pares = []
+    for indice, linha in orcamento.iterrows():
+        numero_linha = indice + 2  # Linha 1 do Excel é o cabeçalho
+        if not LINHAS[0] <= numero_linha <= LINHAS[1]:
+            continue
+        if not ProcessamentoBase.validadorDeLinhasOrcamento(linha, 1, 2):
+            continue
+        descricao = str(linha.iloc[1]).strip()
+        for descricao_ref in referencias:
+            score = SequenceMatcher(None, descricao.lower(), descricao_ref.lower()).ratio()
+            if score > taxa:
+                pares.append((numero_linha, descricao_ref, score * 100))
+    return pares
+
+
+def pares_do_motor(taxa: float, maximo_candidatos: int) -> list:
+    resultados = ProcessamentoBase(parametros(taxa, maximo_candidatos)).processar_dados()
+    return [(r["numero_linha"], r["referencia"], r["similaridade"]) for r in resultados]
+
+
+def comparar_com_limite(esperado: list, obtido: list, limite: int) -> list:
+    """Linhas do orçamento cujo resultado não são os `limite` melhores do laço simples"""
+    por_linha = {}
+    for numero_linha, descricao_ref, score in esperado:
+        por_linha.setdefault(numero_linha, []).append((descricao_ref, score))
+    obtido_por_linha = {}
+    for numero_linha, descricao_ref, score in obtido:
+        obtido_por_linha.setdefault(numero_linha, []).append((descricao_ref, score))
+
+    divergentes = []
+    for numero_linha in sorted(set(por_linha) | set(obtido_por_linha)):
+        todos = por_linha.get(numero_linha, [])
+        escolhidos = obtido_por_linha.get(numero_linha, [])
+        restantes = list(todos)
+        contidos = True
+        for par in escolhidos:
+            if par in restantes:
+                restantes.remove(par)
+            else:
+                contidos = False
+        corte_ok = not escolhidos or not restantes or min(s for _, s in escolhidos) >= max(s for _, s in restantes)
+        if not contidos or len(escolhidos) != min(limite, len(todos)) or not corte_ok:
+            divergentes.append(numero_linha)
+    return divergentes
+
+
+def main() -> int:
+    processamento.logger.setLevel(logging.WARNING)
+    limites = (OperacaoCorrelacao(0, 0, 0).MaximoCandidatos, LIMITE_PEQUENO)
+    falhas = 0
+    for taxa in TAXAS:
+        esperado = correlacionar_laco_simples(taxa)
+
+        obtido = pares_do_motor(taxa, 0)
+        igual = obtido == esperado
+        print(f"taxa {taxa:.2f} | sem limite        | {len(esperado):5d} pares | {'IGUAL' if igual else 'DIFERENTE'}")
+        falhas += not igual
+
+        for limite in limites:
+            divergentes = comparar_com_limite(esperado, pares_do_motor(taxa, limite), limite)
+            print(f"taxa {taxa:.2f} | limite {limite:<10} | {len(divergentes):5d} linhas divergentes"
+                  + (f": {divergentes[:10]}" if divergentes else ""))
+            falhas += bool(divergentes)
+
+    print("OK" if not falhas else f"{falhas} comparações falharam")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
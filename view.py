@@ -57,9 +57,14 @@ class View:
                                                   command=lambda: self.controller.carregar_planilha_gui(2))
         self.btn_carregar_referencia.grid(row=1, column=1, sticky=tk.W, pady=5, padx=5)
         
+        # Um para um: cada linha do orçamento vai para no máximo uma referência (atribuição pelos maiores scores)
+        self.var_um_para_um = tk.BooleanVar(value=False)
+        ttk.Checkbutton(load_frame, text="Um para um (cada linha do orçamento uma única vez)",
+                        variable=self.var_um_para_um).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
+
         self.btn_mesclar = ttk.Button(load_frame, text="Iniciar Análise",
                                       command=self.controller.mesclar_planilhas_gui, state=tk.DISABLED)
-        self.btn_mesclar.grid(row=2, column=0, columnspan=2, pady=10)
+        self.btn_mesclar.grid(row=3, column=0, columnspan=2, pady=10)
         
         ttk.Label(main_frame, text="Log de Atividades:").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.response_text = tk.Text(main_frame, height=5, wrap=tk.WORD, state=tk.DISABLED, bg="#f0f0f0")